@@ -1,27 +1,67 @@
 #!/usr/bin/env python3
 # TODO: make sure it also works in python2
 
-# version 0.0.2
+# version 0.0.3
 
 # updates:
 # - allow multiple input files, using the later ones only for component footprint
 # and distributor
 # - fix code so it works with Kicad 5
+# v0.0.3
+# - cache parsed include files
+# - store components compactly, keeping only line offsets
+# - handle escaped quotes in fields
+# - add project mode, which autofills a root sheet and all its sub-sheets
+# - support Kicad 6+ .kicad_sch files
+# - add parts database, filled using the ingest subcommand
+# - add watch mode, which autofills components as they're changed
+# - match values by their canonical form, so 4k7 matches 4.7k
+# - read a comma between digits as a decimal point in values, so 1,5k
+#     matches 1.5k, unless it separates thousands, as in 2,200u
 
 import argparse
+import concurrent.futures
+import copy
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from values import canonical_value
 
 DISTRIBUTOR_VALUES = ["\"Mouser\""]
 
+# included files that haven't been used for this long are dropped from the cache
+CACHE_MAX_AGE = 30*24*60*60
+# maximum number of (class, value, footprint) entries kept in the cache
+CACHE_MAX_ENTRIES = 1000000
+# bump whenever the stored data changes meaning
+CACHE_VERSION = 5
+# same, for the parts database, whose rows are migrated rather than dropped
+PARTS_DB_VERSION = 3
+
 class Component(object):
+  # there can be hundreds of thousands of these, so keep them small
+  __slots__ = ("designator", "value", "footprint", "footprint_row", "distributors",
+      "cls", "last_value", "num_fields", "start")
+
   def __init__(self, start):
     self.designator = None
     self.value = None
     self.footprint = None
+    # (start offset, end offset) of the footprint line, so it can be
+    # read back and rewritten
     self.footprint_row = None
-    # distributor ids, mapped to (line_num, value, all fields
-    # (to make reconstruction easier)
+    # distributor ids, mapped to DistributorData
     self.distributors = dict()
     self.cls = None
+    # (start offset, end offset) of the last field line; new fields are
+    # inserted after it, using it as a template
     self.last_value = None
     self.num_fields = 0
 
@@ -29,160 +69,1093 @@ class Component(object):
     self.start = start
 
 class DistributorData(object):
+  __slots__ = ("id",)
+
   def __init__(self, id):
     self.id = id
 
-def quotesplit(line):
-  parts = line.split(" ")
-  ret = []
-  num_quotes = 0
-  incomplete_part = None
-  for part in parts:
-    num_quotes += len([None for c in part if c == '"'])
-    if num_quotes % 2 == 1:
-      if incomplete_part is None:
-        # just started a quoted section
-        incomplete_part = part
-      else:
-        incomplete_part += " " + part
+class PatchSet(object):
+  """Edits to a file, keyed by byte offsets into the original file
+
+  Edits are only recorded while parsing; write() then streams the original
+  file to the output in one pass, copying untouched byte ranges straight
+  through, so nothing needs to be kept in memory but the edits themselves.
+  """
+  def __init__(self):
+    # (start, end, sequence number, new data)
+    self.edits = []
+
+  def __len__(self):
+    return len(self.edits)
+
+  def replace(self, start, end, data):
+    if isinstance(data, str):
+      data = data.encode("utf-8")
+    self.edits.append((start, end, len(self.edits), data))
+
+  def insert(self, offset, data):
+    self.replace(offset, offset, data)
+
+  def write(self, src, dst, chunk_size=1 << 16):
+    """Writes src with all the edits applied to dst; both are binary files"""
+    pos = 0
+    src.seek(0)
+    # insertions at the same offset are written out in the order they were added
+    for start, end, _, data in sorted(self.edits):
+      if start < pos:
+        raise ValueError("overlapping edits at offset {}".format(start))
+      _copy_range(src, dst, start - pos, chunk_size)
+      dst.write(data)
+      if end > start:
+        src.seek(end)
+      pos = end
+    _copy_range(src, dst, None, chunk_size)
+
+def _copy_range(src, dst, size, chunk_size):
+  # copies size bytes (or everything left if size is None) from src to dst
+  while size is None or size > 0:
+    to_read = chunk_size if size is None else min(size, chunk_size)
+    chunk = src.read(to_read)
+    if not chunk:
+      break
+    dst.write(chunk)
+    if size is not None:
+      size -= len(chunk)
+
+def write_patched(input_name, output_name, patches):
+  """Applies patches to input_name, writing the result to output_name
+
+  Writing back to the input file goes through a temporary file, because the
+  input is read while the output is being written.
+  """
+  output_dir = os.path.dirname(os.path.abspath(output_name))
+  with open(input_name, "rb") as src:
+    if os.path.exists(output_name) and os.path.samefile(input_name, output_name):
+      fd, tmp_name = tempfile.mkstemp(dir=output_dir, suffix=os.path.splitext(output_name)[1])
+      try:
+        with os.fdopen(fd, "wb") as dst:
+          patches.write(src, dst)
+        # mkstemp files are only readable by their owner
+        shutil.copymode(output_name, tmp_name)
+        os.replace(tmp_name, output_name)
+      except:
+        os.remove(tmp_name)
+        raise
     else:
-      if incomplete_part is not None:
-        # ending quote is in this part
-        ret.append(incomplete_part + " " + part)
-        incomplete_part = None
-      else:
-        # normal case; pass through
-        ret.append(part)
-  return ret
+      with open(output_name, "wb") as dst:
+        patches.write(src, dst)
+
+def read_line(f, row):
+  """Reads back a line recorded as (start offset, end offset) from a binary file"""
+  (start, end) = row
+  f.seek(start)
+  return f.read(end - start).decode("utf-8")
+
+# a field is a run of anything but spaces, where quoted strings (with
+# backslash escapes) may also contain spaces; an unterminated quote is just
+# a normal character. Every field is followed by a single space, so repeated
+# spaces give empty fields
+_FIELD_RE = re.compile(r'((?:[^ "]+|"[^"\\]*(?:\\.[^"\\]*)*"|")*) ')
+
+def quotesplit(line):
+  """Splits a line on spaces, except for spaces inside quoted strings
+
+  Quotes and the line ending are kept in the fields, so joining them with
+  spaces gives back the original line.
+  """
+  return _FIELD_RE.findall(line + " ")
+
+def parse_lines(f, sheets=None):
+  """Parses a schematic opened in binary mode
 
-def parse_lines(f):
-  lines = []
+  Returns the number of lines and the components found; components store
+  byte offsets into the file instead of line numbers, so that the file
+  doesn't need to be kept in memory to be rewritten later. If sheets is a
+  list, the file names of the sub-sheets are appended to it.
+  """
   components = []
   component_start = False
   component = None
+  sheet_start = False
+  offset = 0
+  num_lines = 0
 
-  for i, line in enumerate(f):
+  for i, raw_line in enumerate(f):
+    line = raw_line.decode("utf-8")
+    start = offset
+    offset += len(raw_line)
+    num_lines += 1
     if component_start:
       if line.startswith("L"):
         parts = quotesplit(line)
         component.designator = parts[2].rstrip()
-        component.cls = component.designator[0]
+        component.cls = sys.intern(component.designator[0])
       elif line.startswith("F"):
         parts = quotesplit(line)
         component.num_fields += 1
-        component.last_value = i
+        component.last_value = (start, offset)
         if parts[1].isdigit():
           field_type = int(parts[1])
+          # values, footprints and distributor names repeat a lot, so share them
           if field_type == 1:
-            component.value = parts[2]
+            component.value = sys.intern(parts[2])
           elif field_type == 2:
-            component.footprint_row = (i, parts)
+            component.footprint_row = (start, offset)
             if len(parts[2]) > 2:
-              component.footprint = parts[2]
+              component.footprint = sys.intern(parts[2])
           elif field_type > 3:
             # TODO: make case insensitive
             if parts[-1][:-1] in DISTRIBUTOR_VALUES:
-              component.distributors[parts[-1][:-1]] = DistributorData(parts[2])
+              component.distributors[sys.intern(parts[-1][:-1])] = DistributorData(parts[2])
       elif line.startswith("$EndComp"):
         component_start = False
         # ignore power nodes
         if component.cls != "#":
           components.append(component)
 
+    elif sheet_start:
+      if line.startswith("F1 "):
+        parts = quotesplit(line)
+        if sheets is not None:
+          sheets.append(parts[1][1:-1])
+      elif line.startswith("$EndSheet"):
+        sheet_start = False
+
     if line.startswith("$Comp"):
       component_start = True
       component = Component(i)
-    lines.append(line)
-  return (lines, components)
+    elif line.startswith("$Sheet"):
+      sheet_start = True
+  return (num_lines, components)
+
+# s-expression tokens: an open paren along with the atom at the head of
+# the list, a close paren, or a quoted string (with backslash escapes).
+# Atoms and lists of nothing but atoms (like "(at 1 2 0)", which make up
+# most of a schematic) are skipped over as part of the next match. A quoted
+# string that's cut off by the end of the buffer matches the last alternative.
+_SEXPR_TOKEN_RE = re.compile(
+    br'(?:[^()"]|\([^()"]*\))*'
+    br'(?:(\()\s*([^\s()"]*)|(\))|("(?:[^"\\]|\\.)*")|("(?:[^"\\]|\\.)*\\?\Z))')
+SEXPR_OPEN = 1
+SEXPR_CLOSE = 3
+SEXPR_STRING = 4
+# matches ending this close to the end of the buffer are left for the next
+# chunk, since they might have continued into it
+_SEXPR_MARGIN = 4096
+
+def sexpr_tokens(f, chunk_size=1 << 16):
+  """Yields (token type, token bytes, start offset, end offset) for the
+  tokens of an s-expression file opened in binary mode
+
+  Open paren tokens carry the atom at the head of their list (or b"" if
+  there isn't one). Atoms anywhere else, and lists containing only atoms,
+  aren't reported, since nothing here needs them. The file is read in
+  chunks, so only the chunk being read needs to be kept in memory.
+  """
+  base = 0
+  buf = b""
+  eof = False
+  while not eof:
+    chunk = f.read(chunk_size)
+    eof = len(chunk) == 0
+    buf += chunk
+    consumed = 0
+    for m in _SEXPR_TOKEN_RE.finditer(buf):
+      if not eof and m.end() > len(buf) - _SEXPR_MARGIN:
+        break
+      kind = m.lastindex
+      consumed = m.end()
+      if kind == SEXPR_OPEN + 1:
+        yield (SEXPR_OPEN, m.group(kind), base + m.start(SEXPR_OPEN), base + consumed)
+      elif kind == SEXPR_STRING + 1:
+        raise ValueError("unterminated string at offset {}".format(base + m.start(kind)))
+      else:
+        yield (kind, m.group(kind), base + m.start(kind), base + consumed)
+    base += consumed
+    buf = buf[consumed:]
+
+def parse_sexpr(f, sheets=None):
+  """Parses a Kicad 6+ .kicad_sch schematic opened in binary mode
+
+  Works like parse_lines(), but the schematic is streamed through
+  sexpr_tokens() instead of being loaded as a tree; only the strings of the
+  property being read are kept. Footprint offsets cover the footprint's
+  quoted string, and last field offsets cover the whole last property node.
+  """
+  components = []
+  depth = 0
+  component = None
+  in_sheet = False
+  # (start offset, strings) of the property being read
+  prop = None
+
+  reader = _LineCountingReader(f)
+  for (kind, token, start, end) in sexpr_tokens(reader):
+    if kind == SEXPR_STRING:
+      if prop is not None and depth == 3:
+        prop[1].append((token.decode("utf-8"), start, end))
+    elif kind == SEXPR_OPEN:
+      depth += 1
+      if depth == 1:
+        top_level = token == b"kicad_sch"
+      elif depth == 2 and top_level:
+        if token == b"symbol":
+          component = Component(start)
+        elif token == b"sheet":
+          in_sheet = True
+      elif depth == 3 and token == b"property" and (component is not None or in_sheet):
+        prop = (start, [])
+    else:
+      if depth == 0:
+        raise ValueError("unbalanced parentheses at offset {}".format(start))
+      if depth == 3 and prop is not None:
+        (prop_start, values) = prop
+        prop = None
+        if len(values) >= 2:
+          _add_property(component, in_sheet, sheets, prop_start, end, values[0][0], values[1])
+      elif depth == 2 and component is not None:
+        # ignore power nodes
+        if component.cls != "#":
+          components.append(component)
+        component = None
+      elif depth == 2:
+        in_sheet = False
+      depth -= 1
 
-def infer_components(components):
-  # dictionaries in dictionaries:
-  # distributor = (distributor_type, id) so that non-unique ids can be captured
-  # filled_values[cls][value] = [(footprint, [designators], [distributors])]
-  filled_values = dict()
+  return (reader.num_lines, components)
+
+def _add_property(component, in_sheet, sheets, start, end, name, value):
+  # handles a property node of a symbol or sheet
+  (value, value_start, value_end) = value
+  if in_sheet:
+    if name in ('"Sheet file"', '"Sheetfile"') and sheets is not None:
+      sheets.append(value[1:-1])
+    return
+  component.num_fields += 1
+  component.last_value = (start, end)
+  if name == '"Reference"':
+    component.designator = value[1:-1]
+    component.cls = sys.intern(component.designator[0:1])
+  elif name == '"Value"':
+    component.value = sys.intern(value)
+  elif name == '"Footprint"':
+    component.footprint_row = (value_start, value_end)
+    if len(value) > 2:
+      component.footprint = sys.intern(value)
+  elif name in DISTRIBUTOR_VALUES:
+    component.distributors[sys.intern(name)] = DistributorData(value)
+
+class _LineCountingReader(object):
+  # counts lines as a file is read
+  def __init__(self, f):
+    self.f = f
+    self.num_lines = 0
+
+  def read(self, size):
+    chunk = self.f.read(size)
+    self.num_lines += chunk.count(b"\n")
+    return chunk
+
+_SEXPR_ID_RE = re.compile(r'\(id\s+\d+\)')
+
+def sexpr_property(template, name, value, id):
+  """Makes a property node from the text of another one, giving it a new
+  name, value and (if the template has one) id"""
+  data = template.encode("utf-8")
+  patches = PatchSet()
+  depth = 0
+  strings = 0
+  for (kind, token, start, end) in sexpr_tokens(io.BytesIO(data)):
+    if kind == SEXPR_OPEN:
+      depth += 1
+    elif kind == SEXPR_CLOSE:
+      depth -= 1
+    elif depth == 1 and strings < 2:
+      patches.replace(start, end, value if strings else name)
+      strings += 1
+  out = io.BytesIO()
+  patches.write(io.BytesIO(data), out)
+  return _SEXPR_ID_RE.sub("(id {})".format(id), out.getvalue().decode("utf-8"), 1)
+
+def _indent_before(f, offset):
+  # the whitespace between the start of the line and offset in a binary file
+  start = max(0, offset - 256)
+  f.seek(start)
+  line = f.read(offset - start).decode("utf-8", "replace").rsplit("\n", 1)[-1]
+  return line if line.strip() == "" else " "
+
+def is_kicad_sch(filename):
+  return filename.endswith(".kicad_sch")
+
+def parse_file(filename, sheets=None):
+  """Parses a legacy or Kicad 6+ schematic, depending on its extension"""
+  with open(filename, 'rb') as f:
+    if is_kicad_sch(filename):
+      return parse_sexpr(f, sheets)
+    return parse_lines(f, sheets)
+
+def value_key(value):
+  """Returns the key a (quoted) value is indexed by: its canonical form"""
+  if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+    return '"' + canonical_value(value[1:-1]) + '"'
+  return canonical_value(value)
+
+class FootprintEntry(object):
+  """Everything known about one (class, value, footprint) combination"""
+  __slots__ = ("footprint", "designators", "distributors")
+
+  def __init__(self, footprint):
+    self.footprint = footprint
+    self.designators = []
+    # (distributor, id) pairs; a dict is used as an insertion-ordered set
+    self.distributors = dict()
+
+  def add_distributor(self, dist, id):
+    self.distributors[(dist, id)] = None
+
+  def merge(self, other):
+    self.designators.extend(other.designators)
+    self.distributors.update(other.distributors)
+
+  def __repr__(self):
+    return repr((self.footprint, self.designators, list(self.distributors)))
+
+class ComponentIndex(object):
+  """Component knowledge base used to infer footprints and distributors
+
+  Entries are stored as index[cls][value][footprint] = FootprintEntry, so
+  adding or looking up a component is a few dictionary lookups regardless
+  of how many components have been added. Values are keyed by value_key(),
+  so equivalent spellings of a value share entries.
+  """
+  def __init__(self):
+    self.index = dict()
+
+  def add(self, c):
+    """Adds a component; returns False if it can't be used for inference"""
+    if c.cls is None or len(c.cls) == 0:
+      return False
+    values = self.index.get(c.cls)
+    if values is None:
+      values = self.index[c.cls] = dict()
+    if c.value is None or len(c.value) <= 2:
+      return False
+    key = value_key(c.value)
+    footprints = values.get(key)
+    if footprints is None:
+      footprints = values[key] = dict()
+    if c.footprint is None or len(c.footprint) <= 2:
+      return False
+
+    entry = footprints.get(c.footprint)
+    if entry is None:
+      entry = footprints[c.footprint] = FootprintEntry(c.footprint)
+    entry.designators.append(c.designator)
+    for dist, data in c.distributors.items():
+      if len(data.id) > 2 and len(dist) > 2:
+        entry.distributors[(dist, data.id)] = None
+    return True
+
+  def entry(self, cls, value, footprint):
+    """Returns the entry for a (class, value key, footprint), adding it if
+    needed"""
+    footprints = self.index.setdefault(cls, dict()).setdefault(value, dict())
+    entry = footprints.get(footprint)
+    if entry is None:
+      entry = footprints[footprint] = FootprintEntry(footprint)
+    return entry
+
+  def lookup(self, cls, value, footprint=None):
+    """Returns the entries matching a component
+
+    If footprint is None, all the known footprints for the value are returned
+    """
+    if value is None:
+      return []
+    footprints = self.index.get(cls, dict()).get(value_key(value))
+    if footprints is None:
+      return []
+    if footprint is None:
+      return list(footprints.values())
+    entry = footprints.get(footprint)
+    return [] if entry is None else [entry]
+
+  def merge(self, other):
+    """Merges the entries of another index into this one"""
+    for cls, values in other.index.items():
+      my_values = self.index.setdefault(cls, dict())
+      for value, footprints in values.items():
+        my_values.setdefault(value, dict())
+        for footprint, entry in footprints.items():
+          self.entry(cls, value, footprint).merge(entry)
+
+  def __len__(self):
+    return sum(len(footprints) for values in self.index.values()
+        for footprints in values.values())
+
+def infer_components(components, index=None):
+  """Builds (or adds to) a ComponentIndex from a list of components"""
+  if index is None:
+    index = ComponentIndex()
 
-  # first pass to infer footprints and distributors, second pass to fill in details
   for c in components:
     if c.cls is None or len(c.cls) == 0:
       print("Component at {} incorrectly parsed; no cls set".format(c.start))
     else:
-      if c.cls not in filled_values:
-        filled_values[c.cls] = dict()
-
-      if c.value is not None and len(c.value) > 2:
-        if c.value not in filled_values[c.cls]:
-          filled_values[c.cls][c.value] = []
-
-        if c.footprint is not None and len(c.footprint) > 2:
-          # print(c.designator, c.value, c.footprint, c.distributors)
-          tosearch = filled_values[c.cls][c.value]
-          # find element with matching footprint
-          found = None
-          for i, fp in enumerate(tosearch):
-            if fp[0] == c.footprint:
-              found = i
-              break
-
-          if found is None:
-            distributors = []
-            for dist in c.distributors:
-              if len(c.distributors[dist].id) > 2 and len(dist) > 2:
-                distributors.append((dist, c.distributors[dist].id))
-            tosearch.append((c.footprint, [c.designator], distributors))
+      index.add(c)
+  return index
+
+def summarize_file(filename):
+  """Parses a schematic that's only used for inference
+
+  Returns (number of lines, number of components, number of components
+  without footprints, ComponentIndex); the index is much smaller than the
+  components themselves, so this is cheap to send back from a worker process.
+  """
+  (num_lines, components) = parse_file(filename)
+  without_footprints = len([None for c in components if c.footprint is None])
+  return (num_lines, len(components), without_footprints, infer_components(components))
+
+def parse_sheet(filename):
+  """Parses a schematic that's going to be autofilled
+
+  Returns (number of lines, components, sub-sheet file names)
+  """
+  sheets = []
+  (num_lines, components) = parse_file(filename, sheets)
+  return (num_lines, components, sheets)
+
+def parse_project(root, jobs=None):
+  """Parses a root schematic and all of its sub-sheets, each exactly once
+
+  Each level of the hierarchy is parsed in parallel. Sub-sheet file names
+  are relative to the root schematic's directory. Returns a list of
+  (file name, number of lines, components), starting with the root.
+  """
+  project_dir = os.path.dirname(root)
+  seen = set([os.path.abspath(root)])
+  parsed = []
+  level = [root]
+  executor = None
+  try:
+    while len(level) > 0:
+      if jobs == 1 or len(level) <= 1:
+        results = [parse_sheet(filename) for filename in level]
+      else:
+        if executor is None:
+          executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = list(executor.map(parse_sheet, level))
+
+      next_level = []
+      for filename, (num_lines, components, sheets) in zip(level, results):
+        parsed.append((filename, num_lines, components))
+        for sheet in sheets:
+          sheet = os.path.join(project_dir, sheet)
+          if os.path.abspath(sheet) not in seen:
+            seen.add(os.path.abspath(sheet))
+            next_level.append(sheet)
+      level = next_level
+  finally:
+    if executor is not None:
+      executor.shutdown()
+  return parsed
+
+def autofill(filename, components, filled_values):
+  """Fills in missing footprints and distributors from unique matches
+
+  Returns (PatchSet for the file, footprints filled, components with
+  distributors added)
+  """
+  autofill_fp = 0
+  autofill_dist = 0
+  patches = PatchSet()
+  sexpr = is_kicad_sch(filename)
+  with open(filename, 'rb') as src:
+    for c in components:
+      matches = filled_values.lookup(c.cls, c.value, c.footprint)
+      if len(matches) == 1:
+        # autofill
+        match = matches[0]
+        if ((c.footprint is None or len(c.footprint) <= 2) and 
+            c.footprint_row is not None):
+          print("matched {} {} with {}".format(c.designator, c.value, match))
+          # rewrite footprint
+          c.footprint = match.footprint
+          if sexpr:
+            patches.replace(c.footprint_row[0], c.footprint_row[1], match.footprint)
           else:
-            tosearch[i][1].append(c.designator)
-            # append any new distributors
-            for dist in c.distributors:
-              if len(c.distributors[dist].id) > 2 and len(dist) > 2:
-                if not any([dist == m[0] and c.distributors[dist].id == m[1] 
-                    for m in tosearch[i][2]]):
-                  tosearch[i][2].append((dist, c.distributors[dist].id))
-  return filled_values
+            row = quotesplit(read_line(src, c.footprint_row))
+            row[2] = match.footprint
+            patches.replace(c.footprint_row[0], c.footprint_row[1], " ".join(row))
+          autofill_fp += 1
+        # add in distributors 
+        dist_added = 0
+        for dist in match.distributors:
+          if dist[0] not in c.distributors:
+            c.distributors[dist[0]] = DistributorData(dist[1])
+            # append to the field list
+            if sexpr:
+              prop = sexpr_property(read_line(src, c.last_value), dist[0], dist[1], c.num_fields)
+              patches.insert(c.last_value[1], "\n" + _indent_before(src, c.last_value[0]) + prop)
+            else:
+              template_row = quotesplit(read_line(src, c.last_value)[:-1])
+              row = [
+                  template_row[0],
+                  str(c.num_fields),
+                  dist[1]] + template_row[3:11] + [dist[0] + "\n"]
+              patches.insert(c.last_value[1], " ".join(row))
+            c.num_fields += 1
+            dist_added += 1
+        if dist_added > 0:
+          autofill_dist += 1
+      # print(c.designator, c.value, c.footprint, c.distributors)
+  return (patches, autofill_fp, autofill_dist)
+
+def file_key(filename):
+  """Returns (absolute path, size, mtime) for a file; take it before reading
+  the file, so that changes made while reading it aren't missed"""
+  st = os.stat(filename)
+  return (os.path.abspath(filename), st.st_size, st.st_mtime_ns)
+
+def default_cache_path():
+  cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+  return os.path.join(cache_dir, "kicad-helpers", "autofill_cache.sqlite")
+
+class IncludeCache(object):
+  """SQLite cache of summarize_file() results
+
+  Files are keyed by their absolute path, size and modification time, so
+  editing a file invalidates its entry. Each cached file stores its counts
+  and one row per (class, value, footprint) entry of its ComponentIndex.
+  """
+  def __init__(self, path, max_age=CACHE_MAX_AGE, max_entries=CACHE_MAX_ENTRIES):
+    self.max_age = max_age
+    self.max_entries = max_entries
+    cache_dir = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    self.db = sqlite3.connect(path, timeout=30)
+    version = self.db.execute("PRAGMA user_version").fetchone()[0]
+    if version != CACHE_VERSION:
+      self.db.executescript("""
+        DROP TABLE IF EXISTS entries;
+        DROP TABLE IF EXISTS files;
+        PRAGMA user_version = {};
+      """.format(CACHE_VERSION))
+    self.db.executescript("""
+      CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        last_used REAL NOT NULL,
+        num_lines INTEGER NOT NULL,
+        num_components INTEGER NOT NULL,
+        without_footprints INTEGER NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS entries (
+        file_id INTEGER NOT NULL,
+        cls TEXT NOT NULL,
+        value TEXT NOT NULL,
+        footprint TEXT NOT NULL,
+        designators TEXT NOT NULL,
+        distributors TEXT NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS entries_file ON entries (file_id);
+    """)
+
+  def get(self, key):
+    """Returns the cached summary for a key, or None"""
+    (path, size, mtime_ns) = key
+    row = self.db.execute(
+        "SELECT id, num_lines, num_components, without_footprints FROM files "
+        "WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)).fetchone()
+    if row is None:
+      return None
+    (file_id, num_lines, num_components, without_footprints) = row
+    index = ComponentIndex()
+    for (cls, value, footprint, designators, distributors) in self.db.execute(
+        "SELECT cls, value, footprint, designators, distributors FROM entries "
+        "WHERE file_id = ?", (file_id,)):
+      entry = index.entry(cls, value, footprint)
+      entry.designators = json.loads(designators)
+      for (dist, id) in json.loads(distributors):
+        entry.add_distributor(dist, id)
+    with self.db:
+      self.db.execute("UPDATE files SET last_used = ? WHERE id = ?", (time.time(), file_id))
+    return (num_lines, num_components, without_footprints, index)
+
+  def put(self, key, summary):
+    (path, size, mtime_ns) = key
+    (num_lines, num_components, without_footprints, index) = summary
+    with self.db:
+      self._delete("path = ?", (path,))
+      file_id = self.db.execute(
+          "INSERT INTO files (path, size, mtime_ns, last_used, num_lines, num_components, "
+          "without_footprints) VALUES (?, ?, ?, ?, ?, ?, ?)",
+          (path, size, mtime_ns, time.time(), num_lines, num_components,
+            without_footprints)).lastrowid
+      self.db.executemany(
+          "INSERT INTO entries (file_id, cls, value, footprint, designators, distributors) "
+          "VALUES (?, ?, ?, ?, ?, ?)",
+          ((file_id, cls, value, footprint, json.dumps(entry.designators),
+            json.dumps(list(entry.distributors)))
+            for cls, values in index.index.items()
+            for value, footprints in values.items()
+            for footprint, entry in footprints.items()))
+
+  def prune(self):
+    """Evicts files unused for max_age, then the least recently used files
+    until there are at most max_entries entries"""
+    with self.db:
+      self._delete("last_used < ?", (time.time() - self.max_age,))
+      total = 0
+      evict = []
+      for (file_id, count) in self.db.execute(
+          "SELECT files.id, COUNT(entries.file_id) FROM files "
+          "LEFT JOIN entries ON entries.file_id = files.id "
+          "GROUP BY files.id ORDER BY files.last_used DESC"):
+        total += count
+        if total > self.max_entries:
+          evict.append((file_id,))
+      self.db.executemany("DELETE FROM entries WHERE file_id = ?", evict)
+      self.db.executemany("DELETE FROM files WHERE id = ?", evict)
+
+  def _delete(self, where, params):
+    self.db.execute(
+        "DELETE FROM entries WHERE file_id IN (SELECT id FROM files WHERE {})".format(where),
+        params)
+    self.db.execute("DELETE FROM files WHERE {}".format(where), params)
+
+  def close(self):
+    self.prune()
+    self.db.close()
+
+class PartsDatabase(object):
+  """SQLite store of (class, value, footprint, distributor, part number)
+  associations harvested from past designs
+
+  Designs are added incrementally with ingest(); a design's rows are
+  replaced when it changes. A footprint seen without any distributor is
+  stored with an empty distributor and part number. Values are stored by
+  value_key(), like ComponentIndex.
+  """
+  def __init__(self, path):
+    self.db = sqlite3.connect(path, timeout=30)
+    self.db.executescript("""
+      CREATE TABLE IF NOT EXISTS designs (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        ingested REAL NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS parts (
+        design_id INTEGER NOT NULL,
+        cls TEXT NOT NULL,
+        value TEXT NOT NULL,
+        footprint TEXT NOT NULL,
+        distributor TEXT NOT NULL,
+        part_number TEXT NOT NULL,
+        count INTEGER NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS parts_lookup ON parts (cls, value, footprint);
+      CREATE INDEX IF NOT EXISTS parts_design ON parts (design_id);
+    """)
+    version = self.db.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+      # raw values, from before they were canonicalized
+      self.db.create_function("value_key", 1, value_key)
+      with self.db:
+        self.db.execute("UPDATE parts SET value = value_key(value)")
+    elif version < 3:
+      # values were canonicalized with commas as separators (1,5k as "1 5k"),
+      # then as decimal points (2,200u as 2.2u), which can't be undone;
+      # forget the designs, so the next ingest reads them again
+      with self.db:
+        self.db.execute("DELETE FROM parts")
+        self.db.execute("DELETE FROM designs")
+    self.db.execute("PRAGMA user_version = {}".format(PARTS_DB_VERSION))
+
+  def is_current(self, key):
+    """Returns whether a design with this file_key() is already ingested"""
+    return self.db.execute(
+        "SELECT 1 FROM designs WHERE path = ? AND size = ? AND mtime_ns = ?", key).fetchone() \
+        is not None
+
+  def ingest(self, key, index):
+    """Replaces the parts of a design with the entries of its ComponentIndex"""
+    (path, size, mtime_ns) = key
+    rows = []
+    for cls, values in index.index.items():
+      for value, footprints in values.items():
+        for footprint, entry in footprints.items():
+          count = len(entry.designators)
+          for (dist, id) in entry.distributors or [("", "")]:
+            rows.append((cls, value, footprint, dist, id, count))
+    with self.db:
+      self.db.execute(
+          "DELETE FROM parts WHERE design_id IN (SELECT id FROM designs WHERE path = ?)", (path,))
+      self.db.execute("DELETE FROM designs WHERE path = ?", (path,))
+      design_id = self.db.execute(
+          "INSERT INTO designs (path, size, mtime_ns, ingested) VALUES (?, ?, ?, ?)",
+          (path, size, mtime_ns, time.time())).lastrowid
+      self.db.executemany(
+          "INSERT INTO parts (design_id, cls, value, footprint, distributor, part_number, count) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?)", ((design_id,) + row for row in rows))
+    return len(rows)
+
+  def index_for(self, components):
+    """Returns a ComponentIndex with everything known about the (class,
+    value) pairs of the given components, using one indexed query per pair"""
+    index = ComponentIndex()
+    pairs = set((c.cls, value_key(c.value)) for c in components
+        if c.cls is not None and c.value is not None)
+    for (cls, value) in pairs:
+      for (footprint, dist, id, count) in self.db.execute(
+          "SELECT footprint, distributor, part_number, SUM(count) FROM parts "
+          "WHERE cls = ? AND value = ? GROUP BY footprint, distributor, part_number "
+          "ORDER BY MIN(rowid)", (cls, value)):
+        entry = index.entry(cls, value, footprint)
+        if len(dist) > 0:
+          entry.add_distributor(dist, id)
+    return index
+
+  def close(self):
+    self.db.close()
+
+def summarize_files(filenames, jobs=None, cache=None):
+  """Returns summarize_file() for each file, in order
+
+  Files found in the cache aren't parsed again; the rest are parsed in
+  parallel and added to the cache.
+  """
+  keys = [None]*len(filenames)
+  summaries = [None]*len(filenames)
+  if cache is not None:
+    for i, filename in enumerate(filenames):
+      keys[i] = file_key(filename)
+      summaries[i] = cache.get(keys[i])
+  missing = [i for i, summary in enumerate(summaries) if summary is None]
+
+  if jobs == 1 or len(missing) <= 1:
+    parsed = [summarize_file(filenames[i]) for i in missing]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+      parsed = list(executor.map(summarize_file, [filenames[i] for i in missing]))
+
+  for i, summary in zip(missing, parsed):
+    summaries[i] = summary
+    if cache is not None:
+      cache.put(keys[i], summary)
+  return summaries
+
+def load_includes(args):
+  """Returns a ComponentIndex of the --include files"""
+  index = ComponentIndex()
+  if args.include is None:
+    return index
+  print("searching additional files: {}".format(" ".join(args.include)))
+
+  cache = None if args.no_cache else IncludeCache(args.cache)
+  try:
+    summaries = summarize_files(args.include, args.jobs, cache)
+  finally:
+    if cache is not None:
+      cache.close()
+
+  for (more_lines, more_components, more_without_footprints, more_values) in summaries:
+    print("{} more lines".format(more_lines))
+    print("found {} more components".format(more_components))
+    print("found {} more components without footprints".format(more_without_footprints))
+    index.merge(more_values)
+  return index
+
+# a $Comp block of a legacy schematic, including its line endings
+_COMP_BLOCK_RE = re.compile(br'^\$Comp\r?\n.*?^\$EndComp[^\n]*\n?', re.M | re.S)
+
+class SchematicWatcher(object):
+  """Keeps the components of a legacy schematic, and their ComponentIndex,
+  up to date between changes
+
+  Each update compares the file with its previous contents: $Comp blocks
+  before the first changed byte are kept as they are, those after the last
+  changed byte only have their offsets moved, and only the blocks in between
+  are parsed again. The index is only updated for the components that came
+  and went, so the work done per save follows the size of the edit rather
+  than the size of the schematic.
+  """
+  def __init__(self, filename):
+    self.filename = filename
+    self.stat = None
+    self.data = b""
+    # [start offset, end offset, component or None] of each $Comp block
+    self.blocks = []
+    self.index = ComponentIndex()
+    # the components making up each (class, value key, footprint) entry of
+    # the index
+    self.groups = dict()
+
+  def _stat(self):
+    st = os.stat(self.filename)
+    return (st.st_size, st.st_mtime_ns)
+
+  def changed(self):
+    """Returns whether the file changed since the last update()"""
+    return self._stat() != self.stat
+
+  def update(self):
+    """Reads the file; returns copies of the components in new or edited
+    blocks, which can be autofilled without changing the index"""
+    self.stat = self._stat()
+    with open(self.filename, 'rb') as f:
+      data = f.read()
+    old = self.data
+    prefix = _common_prefix(old, data, 0)
+    suffix = _common_suffix(old, data, prefix)
+    delta = len(data) - len(old)
+
+    # blocks entirely before the edit, and entirely after it
+    first = 0
+    while first < len(self.blocks) and self.blocks[first][1] <= prefix:
+      first += 1
+    last = first
+    while last < len(self.blocks) and self.blocks[last][0] < len(old) - suffix:
+      last += 1
+    removed = [block[2] for block in self.blocks[first:last] if block[2] is not None]
+    after = self.blocks[last:]
+    if delta != 0:
+      for block in after:
+        block[0] += delta
+        block[1] += delta
+        if block[2] is not None:
+          _shift(block[2], delta)
+
+    start = self.blocks[first - 1][1] if first > 0 else 0
+    end = after[0][0] if len(after) > 0 else len(data)
+    edited = []
+    for m in _COMP_BLOCK_RE.finditer(data, start, end):
+      parsed = parse_lines(io.BytesIO(m.group(0)))[1]
+      # power nodes are dropped by the parser
+      c = parsed[0] if len(parsed) > 0 else None
+      if c is not None:
+        _shift(c, m.start())
+      edited.append([m.start(), m.end(), c])
+    self.blocks = self.blocks[:first] + edited + after
+    self.data = data
+
+    added = [block[2] for block in edited if block[2] is not None]
+    self._reindex(removed, added)
+    return [_copy(c) for c in added]
+
+  def _reindex(self, removed, added):
+    affected = set()
+    for c in removed:
+      key = _entry_key(c)
+      if key is not None:
+        del self.groups[key][c]
+        affected.add(key)
+    for c in added:
+      if c.cls is None or len(c.cls) == 0:
+        print("Component at {} incorrectly parsed; no cls set".format(c.start))
+        continue
+      key = _entry_key(c)
+      if key is None:
+        # still registers its class and value
+        self.index.add(c)
+      else:
+        self.groups.setdefault(key, dict())[c] = None
+        affected.add(key)
+    # rebuild just the entries whose components changed
+    for key in affected:
+      (cls, value, footprint) = key
+      self.index.index.get(cls, dict()).get(value, dict()).pop(footprint, None)
+      members = self.groups[key]
+      if len(members) == 0:
+        del self.groups[key]
+      for c in members:
+        self.index.add(c)
+
+def _common_prefix(a, b, start):
+  # length of the common prefix of a[start:] and b[start:], plus start, by
+  # binary search over slice comparisons, which run at memcmp speed
+  (lo, hi) = (start, min(len(a), len(b)))
+  while lo < hi:
+    mid = (lo + hi + 1) // 2
+    if a[lo:mid] == b[lo:mid]:
+      lo = mid
+    else:
+      hi = mid - 1
+  return lo
+
+def _common_suffix(a, b, prefix):
+  # length of the common suffix of a and b, not overlapping their prefix
+  (lo, hi) = (0, min(len(a), len(b)) - prefix)
+  while lo < hi:
+    mid = (lo + hi + 1) // 2
+    if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+      lo = mid
+    else:
+      hi = mid - 1
+  return lo
+
+def _entry_key(c):
+  # the index entry a component is added to, with the same checks as
+  # ComponentIndex.add, or None
+  if c.cls is None or len(c.cls) == 0 or c.value is None or len(c.value) <= 2 or \
+      c.footprint is None or len(c.footprint) <= 2:
+    return None
+  return (c.cls, value_key(c.value), c.footprint)
+
+def _shift(c, delta):
+  # moves a component's offsets by delta bytes, in place
+  if c.footprint_row is not None:
+    c.footprint_row = (c.footprint_row[0] + delta, c.footprint_row[1] + delta)
+  if c.last_value is not None:
+    c.last_value = (c.last_value[0] + delta, c.last_value[1] + delta)
+
+def _copy(c):
+  # copy of a component that autofill() can change
+  copied = copy.copy(c)
+  copied.distributors = dict(c.distributors)
+  return copied
+
+class LayeredIndex(object):
+  """Looks components up in several ComponentIndexes as if they were merged,
+  without copying any of them"""
+  def __init__(self, *indexes):
+    self.indexes = indexes
+
+  def lookup(self, cls, value, footprint=None):
+    found = dict()
+    for index in self.indexes:
+      for entry in index.lookup(cls, value, footprint):
+        if entry.footprint in found:
+          merged = FootprintEntry(entry.footprint)
+          merged.merge(found[entry.footprint])
+          merged.merge(entry)
+          entry = merged
+        found[entry.footprint] = entry
+    return list(found.values())
+
+def watch(args):
+  """Autofills args.input in place whenever it changes, until interrupted
+
+  The included files are only parsed once. On each change only the new or
+  edited components are parsed, indexed and autofilled.
+  """
+  include_values = load_includes(args)
+  db = None if args.db is None else PartsDatabase(args.db)
+  watcher = SchematicWatcher(args.input)
+  print("watching {}...".format(args.input))
+  try:
+    while True:
+      if watcher.changed():
+        changed = watcher.update()
+        layers = [watcher.index, include_values]
+        if db is not None:
+          layers.append(db.index_for(changed))
+        (patches, autofill_fp, autofill_dist) = autofill(args.input, changed, LayeredIndex(*layers))
+        print("{} changed components, autofilled {} fp, {} dist".format(
+            len(changed), autofill_fp, autofill_dist))
+        # don't clobber a save that happened while autofilling; it'll be
+        # picked up on the next poll
+        if len(patches) > 0 and not watcher.changed():
+          write_patched(args.input, args.input, patches)
+      time.sleep(args.interval)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if db is not None:
+      db.close()
+
+def ingest_main(argv):
+  parser = argparse.ArgumentParser(prog="autofill_schem.py ingest",
+      description="Adds schematics to a parts database for autofill_schem.py --db")
+  parser.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to parse files (default: number of CPUs)")
+  parser.add_argument("db", help="parts database to add to; created if it doesn't exist")
+  parser.add_argument("designs", nargs="+", help="schematics to add")
+
+  args = parser.parse_args(argv)
+
+  db = PartsDatabase(args.db)
+  try:
+    keys = [file_key(filename) for filename in args.designs]
+    todo = [i for i, key in enumerate(keys) if not db.is_current(key)]
+    print("{} of {} files changed".format(len(todo), len(keys)))
+    summaries = summarize_files([args.designs[i] for i in todo], args.jobs)
+    for i, (_, num_components, _, index) in zip(todo, summaries):
+      rows = db.ingest(keys[i], index)
+      print("{}: {} components, {} parts".format(args.designs[i], num_components, rows))
+  finally:
+    db.close()
 
 def main():
-  parser = argparse.ArgumentParser(description="Autofills components in an Eeschema schematic")
+  if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+    ingest_main(sys.argv[2:])
+    return
+
+  parser = argparse.ArgumentParser(description="Autofills components in an Eeschema schematic",
+      epilog="use \"%(prog)s ingest\" to add schematics to a parts database for --db")
   parser.add_argument("-i", "--include", action="append", help="additional files to read in, for component inference")
+  parser.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to parse files (default: number of CPUs)")
+  parser.add_argument("--cache", default=default_cache_path(),
+      help="file to cache parsed included files in (default: %(default)s)")
+  parser.add_argument("--no-cache", action="store_true", help="don't cache parsed included files")
+  parser.add_argument("-d", "--db",
+      help="parts database to consult, filled using the ingest subcommand")
+  parser.add_argument("-p", "--project", action="store_true",
+      help="treat input as a root schematic, and autofill all of its sub-sheets too")
+  parser.add_argument("-w", "--watch", action="store_true",
+      help="keep running, autofilling the input in place every time it's saved")
+  parser.add_argument("--interval", type=float, default=1.0,
+      help="seconds between checks for changes in watch mode (default: %(default)s)")
   parser.add_argument("input", help="file to autofill")
-  parser.add_argument("output", help="file to write autofilled schematic to")
+  parser.add_argument("output", nargs="?",
+      help="file to write autofilled schematic to (default: overwrite input); in project mode, "
+      "directory to write all sheets to (default: overwrite modified sheets)")
 
   args = parser.parse_args()
 
-  lines = None
-  components = None
+  if args.watch:
+    if args.project or is_kicad_sch(args.input):
+      parser.error("watch mode only works on single legacy schematics")
+    if args.output is not None and args.output != args.input:
+      parser.error("watch mode autofills the input in place; don't give an output file")
+    watch(args)
+    return
+
+  if args.project:
+    sheets = parse_project(args.input, args.jobs)
+    print("found {} sheets".format(len(sheets)))
+  else:
+    (num_lines, components) = parse_file(args.input)
+    sheets = [(args.input, num_lines, components)]
 
-  with open(args.input, 'r') as f:
-    (lines, components) = parse_lines(f)
+  num_lines = sum(sheet[1] for sheet in sheets)
+  components = [c for sheet in sheets for c in sheet[2]]
 
-  print("{} lines".format(len(lines)))
+  print("{} lines".format(num_lines))
   print("found {} components".format(len(components)))
   without_footprints = len([None for c in components if c.footprint is None])
   print("found {} components without footprints".format(without_footprints))
 
-  all_components = []
-  all_components.extend(components)
+  filled_values = infer_components(components)
 
-  if args.include is not None:
-    print("searching additional files: {}".format(" ".join(args.include)))
+  filled_values.merge(load_includes(args))
 
-    for filename in args.include:
-      with open(filename, 'r') as f:
-        (more_lines, more_components) = parse_lines(f)
-      print("{} more lines".format(len(more_lines)))
-      print("found {} more components".format(len(more_components)))
-      more_without_footprints = len([None for c in more_components if c.footprint is None])
-      print("found {} more components without footprints".format(more_without_footprints))
-      all_components.extend(more_components)
+  if args.db is not None:
+    db = PartsDatabase(args.db)
+    try:
+      filled_values.merge(db.index_for(components))
+    finally:
+      db.close()
 
-  filled_values = infer_components(all_components)
-
-  entry_count = 0
+  # TODO: check for conflicts
   conflicts = []
-  for cls in filled_values:
-    for val in filled_values[cls]:
-      for _ in filled_values[cls][val]:
-        # TODO: check for conflicts
-        entry_count += 1
-  print("found {} filled unique component classes".format(entry_count))
+  print("found {} filled unique component classes".format(len(filled_values)))
 
   # TODO: allow interactive distributor choice to resolve conflicts
   while len(conflicts) > 0:
@@ -194,53 +1167,12 @@ def main():
   # autofill
   autofill_fp = 0
   autofill_dist = 0
-  to_append = []
-  for c in components:
-    if c.cls in filled_values:
-      if c.value in filled_values[c.cls]:
-        matches = []
-        if c.footprint is not None:
-          matches = [t for t in filled_values[c.cls][c.value] if t[0] == c.footprint]
-        else:
-          matches = filled_values[c.cls][c.value]
-        if len(matches) == 1:
-          # autofill
-          match = matches[0]
-          if ((c.footprint is None or len(c.footprint) <= 2) and 
-              c.footprint_row is not None):
-            print("matched {} {} with {}".format(c.designator, c.value, match))
-            # rewrite footprint
-            c.footprint = match[0]
-            row = c.footprint_row[1]
-            row[2] = match[0]
-            lines[c.footprint_row[0]] = " ".join(row)
-            autofill_fp += 1
-          # add in distributors 
-          dist_added = 0
-          for dist in match[2]:
-            if dist[0] not in c.distributors:
-              c.distributors[dist[0]] = DistributorData(dist[1])
-              # append to the field list
-              template_row = quotesplit(lines[c.last_value][:-1])
-              row = [
-                  template_row[0],
-                  str(c.num_fields),
-                  dist[1]] + template_row[3:11] + [dist[0] + "\n"]
-              c.num_fields += 1
-              to_append.append((c.last_value, row))
-              dist_added += 1
-              # mark as something to do, because appending now would
-              # cause the row numbers to shift for all the components after this one,
-              # invalidating their indices
-          if dist_added > 0:
-            autofill_dist += 1
-
-    # print(c.designator, c.value, c.footprint, c.distributors)
-  for ta in reversed(to_append):
-    idx = ta[0]
-    row = ta[1]
-    lines = lines[0:idx+1] + [" ".join(row)] + lines[idx+1:]
-
+  sheet_patches = []
+  for (filename, _, sheet_components) in sheets:
+    (patches, sheet_fp, sheet_dist) = autofill(filename, sheet_components, filled_values)
+    sheet_patches.append((filename, patches))
+    autofill_fp += sheet_fp
+    autofill_dist += sheet_dist
   print("autofilled {} fp, {} dist".format(autofill_fp, autofill_dist))
   # dictionary of dictionaries of components without footprints
   # missing[cls][value] = [designators]
@@ -276,11 +1208,25 @@ def main():
       print("NOTE: no distributor data found for {} {}".format(value, missing[cls][value]))
 
 
-  output = args.output or args.input
-  print("outputting to {}...".format(output))
-  with open(output, "w+") as f:
-    for line in lines:
-      f.write(line)
+  if not args.project:
+    output = args.output or args.input
+    print("outputting to {}...".format(output))
+    write_patched(args.input, output, sheet_patches[0][1])
+    return
+
+  project_dir = os.path.dirname(args.input)
+  for (filename, patches) in sheet_patches:
+    if args.output is None:
+      # only touch the sheets that changed
+      if len(patches) == 0:
+        continue
+      output = filename
+    else:
+      output = os.path.join(args.output, os.path.relpath(filename, project_dir))
+      if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    print("outputting {} to {}...".format(filename, output))
+    write_patched(filename, output, patches)
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# benchmarks for autofill_schem.py, run with a benchmark name, or nothing
+# to run all of them
+
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+import autofill_schem
+
+def make_components(n, seed=0, num_values=24, num_footprints=56, num_parts=None):
+  # synthetic passives: num_values values per class, each seen in up to
+  # num_footprints footprints and bought under up to num_parts part numbers
+  rng = random.Random(seed)
+  multipliers = ["{}{}".format(m, p) for p in ["", "k", "M", "n", "u", "p"] for m in range(1, 1000)]
+  values = ['"{}"'.format(v) for v in multipliers[:num_values]]
+  footprints = ['"Lib:{}_{}"'.format(size, variant) for size in
+      ["0201", "0402", "0603", "0805", "1206", "1210", "2512"] for variant in range(num_footprints // 7 + 1)]
+  footprints = footprints[:num_footprints]
+  if num_parts is None:
+    num_parts = n // 4 + 1
+  components = []
+  for i in range(n):
+    c = autofill_schem.Component(i)
+    c.cls = rng.choice("RCL")
+    c.designator = "{}{}".format(c.cls, i + 1)
+    c.value = rng.choice(values)
+    c.footprint = rng.choice(footprints)
+    c.distributors['"Mouser"'] = autofill_schem.DistributorData(
+        '"MP-{}"'.format(rng.randrange(num_parts)))
+    components.append(c)
+  return components
+
+def make_schematic(n, seed=0):
+  # synthetic legacy schematic with n components, as bytes
+  rng = random.Random(seed)
+  values = ["10k", "4k7", "100n", "1u", "22p", "0"]
+  footprints = ["", "Resistor_SMD:R_0402", "Capacitor_SMD:C_0603"]
+  out = ["EESchema Schematic File Version 4\nEELAYER 30 0\nEELAYER END\n"]
+  for i in range(n):
+    cls = rng.choice("RC")
+    value = rng.choice(values)
+    footprint = rng.choice(footprints)
+    out.append("$Comp\nL Device:{0} {0}{1}\nU 1 1 5E{1:06X}\nP {1} {1}\n".format(cls, i + 1))
+    out.append('F 0 "{}{}" H 100 100 50  0000 L CNN\n'.format(cls, i + 1))
+    out.append('F 1 "{}" H 100 0 50  0000 L CNN\n'.format(value))
+    out.append('F 2 "{}" V 0 0 50  0001 C CNN\n'.format(footprint))
+    out.append('F 3 "~" H 0 0 50  0001 C CNN\n')
+    if footprint and i % 2:
+      out.append('F 4 "MP-{}-{}" H 0 0 50  0001 C CNN "Mouser"\n'.format(value, i % 100))
+    out.append("\t1    {0} {0}\n\t1    0    0    -1  \n$EndComp\n".format(i))
+  out.append("$EndSCHEMATC\n")
+  return "".join(out).encode("utf-8")
+
+def quotesplit_rejoin(line):
+  # the previous split-and-rejoin tokenizer, kept for comparison
+  parts = line.split(" ")
+  ret = []
+  num_quotes = 0
+  incomplete_part = None
+  for part in parts:
+    num_quotes += len([None for c in part if c == '"'])
+    if num_quotes % 2 == 1:
+      if incomplete_part is None:
+        # just started a quoted section
+        incomplete_part = part
+      else:
+        incomplete_part += " " + part
+    else:
+      if incomplete_part is not None:
+        # ending quote is in this part
+        ret.append(incomplete_part + " " + part)
+        incomplete_part = None
+      else:
+        # normal case; pass through
+        ret.append(part)
+  return ret
+
+def infer_components_linear(components):
+  # the previous list-based implementation, kept for comparison
+  filled_values = dict()
+  for c in components:
+    values = filled_values.setdefault(c.cls, dict())
+    tosearch = values.setdefault(c.value, [])
+    found = None
+    for i, fp in enumerate(tosearch):
+      if fp[0] == c.footprint:
+        found = i
+        break
+    if found is None:
+      distributors = [(dist, c.distributors[dist].id) for dist in c.distributors]
+      tosearch.append((c.footprint, [c.designator], distributors))
+    else:
+      tosearch[found][1].append(c.designator)
+      for dist in c.distributors:
+        if not any([dist == m[0] and c.distributors[dist].id == m[1]
+            for m in tosearch[found][2]]):
+          tosearch[found][2].append((dist, c.distributors[dist].id))
+  return filled_values
+
+def timed(fn, *args):
+  start = time.perf_counter()
+  ret = fn(*args)
+  return ret, time.perf_counter() - start
+
+def bench_index():
+  # narrow: a handful of footprints per value, so a list scan is short too;
+  # wide: a few values used in thousands of footprints and part numbers,
+  # where the list scan grows with the number of components
+  workloads = [
+      ("narrow", [1000, 10000, 100000], lambda n: make_components(n)),
+      # the linear version takes minutes at 100000
+      ("wide", [1000, 10000, 30000], lambda n: make_components(n, num_values=2,
+        num_footprints=n // 10 + 1, num_parts=n // 2 + 1)),
+  ]
+  print("workload   components   linear (s)   indexed (s)   speedup")
+  for name, sizes, make in workloads:
+    for n in sizes:
+      components = make(n)
+      _, linear = timed(infer_components_linear, components)
+      _, indexed = timed(autofill_schem.infer_components, components)
+      print("{:<8}   {:>10}   {:>10.4f}   {:>11.4f}   {:>7.1f}x".format(
+          name, n, linear, indexed, linear / indexed))
+
+def bench_memory():
+  n = 50000
+  data = make_schematic(n)
+  tracemalloc.start()
+  (_, components) = autofill_schem.parse_lines(io.BytesIO(data))
+  (used, _) = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  print("{} components, {:.1f} MB schematic".format(len(components), len(data) / 1e6))
+  print("parsed components use {:.1f} MB, {:.0f} bytes per component".format(
+      used / 1e6, used / len(components)))
+
+def bench_tokenizer():
+  lines = [line for line in make_schematic(20000).decode("utf-8").splitlines(True)
+      if line.startswith("L") or line.startswith("F")]
+  rejoin = min(timed(lambda: [quotesplit_rejoin(line) for line in lines])[1] for _ in range(3))
+  single = min(timed(lambda: [autofill_schem.quotesplit(line) for line in lines])[1]
+      for _ in range(3))
+  print("{} lines: split and rejoin {:.4f} s, single pass {:.4f} s, {:.1f}x".format(
+      len(lines), rejoin, single, rejoin / single))
+
+BENCHMARKS = {
+    "index": bench_index,
+    "memory": bench_memory,
+    "tokenizer": bench_tokenizer,
+}
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks autofill_schem.py")
+  parser.add_argument("benchmarks", nargs="*",
+      help="benchmarks to run, out of: {}".format(", ".join(sorted(BENCHMARKS))))
+  args = parser.parse_args()
+  for name in args.benchmarks:
+    if name not in BENCHMARKS:
+      parser.error("unknown benchmark {}".format(name))
+  for name in args.benchmarks or sorted(BENCHMARKS):
+    print("== {} ==".format(name))
+    BENCHMARKS[name]()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# benchmarks for gen_bom.py, run with a benchmark name, or nothing to run
+# all of them
+
+import argparse
+import copy
+import io
+import random
+import time
+import tracemalloc
+import warnings
+
+from bs4 import BeautifulSoup
+
+import gen_bom
+
+def make_netlist(n, groups=500, seed=0):
+  # synthetic Eeschema XML netlist with n components spread over about
+  # `groups` distinct parts
+  rng = random.Random(seed)
+  parts = []
+  for i in range(groups):
+    cls = rng.choice("RCL")
+    parts.append((cls, "{}{}".format(i, rng.choice(["", "k", "n", "u"])),
+        "{}_{}".format(cls, rng.choice(["0402", "0603", "0805"])), "MP-{}".format(i)))
+  out = ['<?xml version="1.0" encoding="UTF-8"?>\n<export version="D">\n',
+      '  <design>\n    <source>bench.sch</source>\n    <date>today</date>\n  </design>\n',
+      '  <components>\n']
+  for i in range(n):
+    (cls, value, footprint, part_num) = rng.choice(parts)
+    out.append('    <comp ref="{}{}">\n      <value>{}</value>\n'.format(cls, i + 1, value))
+    out.append('      <footprint>Lib:{}</footprint>\n'.format(footprint))
+    out.append('      <fields>\n        <field name="Package">{}</field>\n'.format(footprint))
+    out.append('        <field name="Mouser">{}</field>\n      </fields>\n'.format(part_num))
+    out.append('      <libsource lib="Device" part="{}"/>\n'.format(cls))
+    out.append('      <tstamp>{:08X}</tstamp>\n    </comp>\n'.format(i))
+  out.append('  </components>\n  <nets>\n')
+  for i in range(n // 2):
+    out.append('    <net code="{0}" name="N{0}">\n'.format(i))
+    out.append('      <node ref="R{}" pin="1"/>\n'.format(i + 1))
+    out.append('      <node ref="C{}" pin="2"/>\n    </net>\n'.format(i + 1))
+  out.append('  </nets>\n</export>\n')
+  return "".join(out)
+
+def group_components_pairwise(comps):
+  # the previous implementation, which stringifies every pair of
+  # components; kept for comparison
+  comp = {}
+  i = 1
+  for new_comp in comps:
+    found = None
+    new_comp_no_ref = {}
+    for k in new_comp.keys():
+      if k != 'Reference':
+        new_comp_no_ref[k] = new_comp[k]
+    for c2 in comp.values():
+      c2_no_ref = {}
+      for k in c2.keys():
+        if k != 'Reference':
+          c2_no_ref[k] = c2[k]
+      if str(c2_no_ref) == str(new_comp_no_ref):
+        found = c2
+        c2['Reference'].extend(new_comp['Reference'])
+        break
+    if found == None:
+      comp[i] = new_comp
+    i += 1
+  return list(comp.values())
+
+def timed(fn, *args):
+  start = time.perf_counter()
+  ret = fn(*args)
+  return ret, time.perf_counter() - start
+
+def bench_grouping():
+  n = 20000
+  with warnings.catch_warnings():
+    # gen_bom.py doesn't pick a parser either
+    warnings.simplefilter("ignore")
+    soup = BeautifulSoup(make_netlist(n))
+  comps = list(gen_bom.read_components_soup(soup, []))
+  print("components   pairwise (s)   keyed (s)   speedup")
+  for size in [1000, 5000, n]:
+    (old, pairwise) = timed(group_components_pairwise, copy.deepcopy(comps[:size]))
+    (new, keyed) = timed(gen_bom.group_components, copy.deepcopy(comps[:size]))
+    assert [c['Reference'] for c in old] == [c['Reference'] for c in new]
+    print("{:>10}   {:>12.4f}   {:>9.4f}   {:>7.0f}x".format(
+        size, pairwise, keyed, pairwise / keyed))
+
+def read_soup(data):
+  with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    soup = BeautifulSoup(data.decode("utf-8"))
+  return len(list(gen_bom.read_components_soup(soup, [])))
+
+def read_streaming(data):
+  return len(list(gen_bom.read_components(io.BytesIO(data), [])))
+
+def bench_reader():
+  data = make_netlist(20000).encode("utf-8")
+  print("{:.1f} MB netlist".format(len(data) / 1e6))
+  for name, fn in [("BeautifulSoup", read_soup), ("streaming", read_streaming)]:
+    (count, elapsed) = timed(fn, data)
+    # tracing slows things down, so memory is measured on a separate run
+    tracemalloc.start()
+    fn(data)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:>13}: {} components in {:.2f} s, {:.1f} MB peak".format(
+        name, count, elapsed, peak / 1e6))
+
+BENCHMARKS = {
+    "grouping": bench_grouping,
+    "reader": bench_reader,
+}
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks gen_bom.py")
+  parser.add_argument("benchmarks", nargs="*",
+      help="benchmarks to run, out of: {}".format(", ".join(sorted(BENCHMARKS))))
+  args = parser.parse_args()
+  for name in args.benchmarks:
+    if name not in BENCHMARKS:
+      parser.error("unknown benchmark {}".format(name))
+  for name in args.benchmarks or sorted(BENCHMARKS):
+    print("== {} ==".format(name))
+    BENCHMARKS[name]()
+
+if __name__ == "__main__":
+  main()
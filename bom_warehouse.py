@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# keeps the grouped BOMs of many projects' netlists in one SQLite database,
+# so part usage across all of them is an indexed query away
+#
+#   bom_warehouse.py ingest PROJECTS_DIR ...   add or update netlists
+#   bom_warehouse.py uses PART                 boards using a part number
+#   bom_warehouse.py usage VALUE [PACKAGE]     parts used per year, by class
+#   bom_warehouse.py volume BOARD N            set a board's yearly builds
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import time
+
+import gen_bom
+from values import canonical_value
+
+DEFAULT_DB = "bom_warehouse.sqlite"
+# bump whenever the stored data changes meaning; the BOMs are rebuilt from
+# the netlists at the next ingest, keeping each board's yearly volume
+WAREHOUSE_VERSION = 2
+# fields describing a part rather than identifying where to buy it; every
+# other field (PN, Mouser, Digikey...) is searched by "uses"
+DESCRIPTIVE_FIELDS = [f for f in gen_bom.standard_fields if f != 'PN'] + gen_bom.list_fields
+
+def file_hash(filename):
+  h = hashlib.sha256()
+  with open(filename, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 16), b""):
+      h.update(chunk)
+  return h.hexdigest()
+
+def is_netlist(filename):
+  # KiCad XML netlists; other .xml files in projects are skipped
+  with open(filename, 'rb') as f:
+    return b"<export" in f.read(512)
+
+def find_netlists(paths):
+  """Yields the netlists given, and those found under the directories given"""
+  for path in paths:
+    if not os.path.isdir(path):
+      yield path
+      continue
+    for dirpath, dirnames, filenames in os.walk(path):
+      dirnames.sort()
+      for filename in sorted(filenames):
+        filename = os.path.join(dirpath, filename)
+        if filename.endswith(".xml") and is_netlist(filename):
+          yield filename
+
+class Warehouse(object):
+  """SQLite store of grouped BOMs, one per netlist
+
+  Netlists are keyed by their absolute path and replaced when their
+  contents' hash changes. Each BOM group is a row of groups, with its class
+  (reference prefix) and canonical value, and its identifying fields (part
+  numbers) are rows of fields, indexed by value.
+  """
+  def __init__(self, path):
+    self.db = sqlite3.connect(path, timeout=30)
+    version = self.db.execute("PRAGMA user_version").fetchone()[0]
+    if version != WAREHOUSE_VERSION:
+      self.db.executescript("""
+        DROP TABLE IF EXISTS fields;
+        DROP TABLE IF EXISTS groups;
+      """)
+    self.db.executescript("""
+      CREATE TABLE IF NOT EXISTS boards (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        ingested REAL NOT NULL,
+        volume INTEGER NOT NULL DEFAULT 0
+      );
+      CREATE TABLE IF NOT EXISTS groups (
+        id INTEGER PRIMARY KEY,
+        board_id INTEGER NOT NULL,
+        class TEXT NOT NULL,
+        value TEXT NOT NULL,
+        package TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        refs TEXT NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS fields (
+        group_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        value TEXT NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS boards_name ON boards (name);
+      CREATE INDEX IF NOT EXISTS groups_board ON groups (board_id);
+      CREATE INDEX IF NOT EXISTS groups_value ON groups (value, package);
+      CREATE INDEX IF NOT EXISTS groups_class ON groups (class, value);
+      CREATE INDEX IF NOT EXISTS fields_value ON fields (value);
+      CREATE INDEX IF NOT EXISTS fields_group ON fields (group_id);
+    """)
+    if version != WAREHOUSE_VERSION:
+      with self.db:
+        # ingest every netlist again
+        self.db.execute("UPDATE boards SET hash = ''")
+      self.db.execute("PRAGMA user_version = {}".format(WAREHOUSE_VERSION))
+
+  def hashes(self):
+    """Returns {path: hash} of every ingested netlist"""
+    return dict(self.db.execute("SELECT path, hash FROM boards"))
+
+  def ingest(self, path, digest, comp):
+    """Replaces the BOM of a netlist with its grouped components, keeping
+    its yearly volume"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    with self.db:
+      row = self.db.execute("SELECT volume FROM boards WHERE path = ?", (path,)).fetchone()
+      volume = row[0] if row is not None else 0
+      self._delete(path)
+      board_id = self.db.execute(
+          "INSERT INTO boards (path, name, hash, ingested, volume) VALUES (?, ?, ?, ?, ?)",
+          (path, name, digest, time.time(), volume)).lastrowid
+      for c in comp:
+        group_id = self.db.execute(
+            "INSERT INTO groups (board_id, class, value, package, quantity, refs) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (board_id, gen_bom.component_class(c['Reference'][0]), canonical_value(c['Value']),
+              c['Package'], len(c['Reference']), ';'.join(c['Reference']))).lastrowid
+        self.db.executemany("INSERT INTO fields (group_id, name, value) VALUES (?, ?, ?)",
+            ((group_id, k, v) for k, v in c.items() if k not in DESCRIPTIVE_FIELDS and v))
+
+  def _delete(self, path):
+    self.db.execute("DELETE FROM fields WHERE group_id IN (SELECT groups.id FROM groups "
+        "JOIN boards ON groups.board_id = boards.id WHERE boards.path = ?)", (path,))
+    self.db.execute("DELETE FROM groups WHERE board_id IN "
+        "(SELECT id FROM boards WHERE path = ?)", (path,))
+    self.db.execute("DELETE FROM boards WHERE path = ?", (path,))
+
+  def remove(self, path):
+    with self.db:
+      self._delete(path)
+
+  def set_volume(self, board, volume):
+    """Sets the yearly builds of boards with a name or path; returns how
+    many were found"""
+    with self.db:
+      return self.db.execute("UPDATE boards SET volume = ? WHERE name = ? OR path = ?",
+          (volume, board, os.path.abspath(board))).rowcount
+
+  def uses(self, part_num):
+    """Returns (board path, field, quantity, references) of every group with
+    a field equal to part_num"""
+    return self.db.execute(
+        "SELECT boards.path, fields.name, groups.quantity, groups.refs FROM fields "
+        "JOIN groups ON fields.group_id = groups.id JOIN boards ON groups.board_id = boards.id "
+        "WHERE fields.value = ? ORDER BY boards.path", (part_num,)).fetchall()
+
+  def usage(self, value, package=None, cls=None):
+    """Returns (board path, class, package, quantity per board, yearly
+    volume) of the boards using a value, optionally only in one package or
+    class"""
+    query = ("SELECT boards.path, groups.class, groups.package, SUM(groups.quantity), boards.volume "
+        "FROM groups JOIN boards ON groups.board_id = boards.id WHERE groups.value = ?")
+    params = [canonical_value(value)]
+    if package is not None:
+      query += " AND groups.package = ?"
+      params.append(package)
+    if cls is not None:
+      query += " AND groups.class = ?"
+      params.append(cls)
+    query += " GROUP BY boards.id, groups.class, groups.package ORDER BY boards.path"
+    return self.db.execute(query, params).fetchall()
+
+  def close(self):
+    self.db.close()
+
+def read_netlist(filename):
+  return gen_bom.read_board(filename)[0]
+
+def ingest_main(db, args):
+  filenames = [os.path.abspath(f) for f in find_netlists(args.paths)]
+  hashes = db.hashes()
+  digests = [file_hash(f) for f in filenames]
+  todo = [i for i, (f, digest) in enumerate(zip(filenames, digests)) if hashes.get(f) != digest]
+  print("{} of {} netlists changed".format(len(todo), len(filenames)))
+
+  with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+    parsed = executor.map(read_netlist, [filenames[i] for i in todo])
+    for i, comp in zip(todo, parsed):
+      db.ingest(filenames[i], digests[i], comp)
+      print("{}: {} parts".format(filenames[i], len(comp)))
+
+  if args.prune:
+    for path in hashes:
+      if not os.path.exists(path):
+        db.remove(path)
+        print("{}: removed".format(path))
+
+def uses_main(db, args):
+  rows = db.uses(args.part)
+  for (path, field, quantity, refs) in rows:
+    print("{} ({}): {} x {}".format(path, field, quantity, refs))
+  print("{} boards".format(len(set(path for (path, _, _, _) in rows))))
+
+def usage_main(db, args):
+  total = 0
+  for (path, cls, package, quantity, volume) in db.usage(args.value, args.package, args.cls):
+    print("{} {} {}: {} per board, {} boards per year".format(path, cls, package, quantity,
+      volume))
+    total += quantity*volume
+  print("{} per year".format(total))
+
+def volume_main(db, args):
+  if db.set_volume(args.board, args.volume) == 0:
+    print("[WARN] no board named {}".format(args.board))
+
+def main():
+  parser = argparse.ArgumentParser(description="Keeps the BOMs of many projects in one database")
+  parser.add_argument("-d", "--db", default=DEFAULT_DB, help="database file (default: %(default)s)")
+  subparsers = parser.add_subparsers(dest="command")
+  subparsers.required = True
+
+  ingest = subparsers.add_parser("ingest", help="add netlists, skipping unchanged ones")
+  ingest.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to read netlists (default: number of CPUs)")
+  ingest.add_argument("--prune", action="store_true", help="remove netlists that no longer exist")
+  ingest.add_argument("paths", nargs="+", help="Eeschema XML netlists, or directories to search for them")
+  ingest.set_defaults(func=ingest_main)
+
+  uses = subparsers.add_parser("uses", help="list boards using a part number")
+  uses.add_argument("part", help="part number, in any field (PN, Mouser, Digikey...)")
+  uses.set_defaults(func=uses_main)
+
+  usage = subparsers.add_parser("usage", help="count parts used per year, from each board's volume")
+  usage.add_argument("value", help="component value, e.g. 10k")
+  usage.add_argument("package", nargs="?", help="only count this package, e.g. 0402")
+  usage.add_argument("-c", "--class", dest="cls",
+      help="only count this class of component (reference prefix), e.g. C")
+  usage.set_defaults(func=usage_main)
+
+  volume = subparsers.add_parser("volume", help="set how many of a board are built per year")
+  volume.add_argument("board", help="board name (netlist file name without extension) or netlist")
+  volume.add_argument("volume", type=int)
+  volume.set_defaults(func=volume_main)
+
+  args = parser.parse_args()
+  db = Warehouse(args.db)
+  try:
+    args.func(db, args)
+  finally:
+    db.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,66 @@
+# geometry shared by the gen_mfg_* footprint generators
+#
+# Footprints are drawn unrotated, as arrays of points ((N, 2)) or line
+# segments ((N, 4): start x, start y, end x, end y), then rotated in one go
+# by the footprint's Transform. Rotations by multiples of 90 degrees use an
+# exact matrix, so they don't leave values like -1.8e-16 behind.
+import math
+
+import numpy as np
+
+# (cos, sin) of rotations that should be exact
+_EXACT = {0: (1.0, 0.0), 90: (0.0, 1.0), 180: (-1.0, 0.0), 270: (0.0, -1.0)}
+
+def rotation_matrix(rotation):
+  """Returns the 2x2 matrix rotating counterclockwise by rotation degrees"""
+  if rotation % 90 == 0:
+    (c, s) = _EXACT[int(rotation) % 360]
+  else:
+    c = math.cos(rotation*math.pi/180.)
+    s = math.sin(rotation*math.pi/180.)
+  return np.array([[c, -s], [s, c]])
+
+class Transform(object):
+  """Rotation about the origin followed by an offset, precomputed once per
+  footprint"""
+  def __init__(self, rotation=0, offset=(0.0, 0.0)):
+    self.rotation = rotation
+    self.matrix = rotation_matrix(rotation)
+    self.offset = np.asarray(offset, dtype=np.float64)
+
+  def swaps_axes(self):
+    """Returns whether sizes along x and y are swapped, i.e. the rotation is
+    an odd multiple of 90 degrees"""
+    return self.rotation % 180 == 90
+
+  def points(self, points):
+    """Transforms an (N, 2) array of points"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    # adding 0.0 turns -0.0 into 0.0
+    return points.dot(self.matrix.T) + self.offset + 0.0
+
+  def segments(self, segments):
+    """Transforms an (N, 4) array of line segments"""
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    return self.points(segments.reshape(-1, 2)).reshape(-1, 4)
+
+def pitch_offsets(n, pitch):
+  """Returns the positions of n pads at pitch, centered on 0"""
+  return pitch*(np.arange(n) - (n/2. - 0.5))
+
+def grid(num_x, num_y, pitch_x, pitch_y):
+  """Returns an (num_x*num_y, 2) array of the centers of a grid of pads, in
+  column major order (all of the first column, then the second...)"""
+  (x, y) = np.meshgrid(pitch_offsets(num_x, pitch_x), pitch_offsets(num_y, pitch_y),
+      indexing='ij')
+  return np.column_stack([x.ravel(), y.ravel()])
+
+def closed_path(points, backwards=False):
+  """Returns the segments joining each point of a closed path to the next
+  one, from the last point back to the first; if backwards, each segment is
+  drawn from a point to the one before it instead"""
+  points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+  previous = np.roll(points, 1, axis=0)
+  if backwards:
+    return np.hstack([points, previous])
+  return np.hstack([previous, points])
@@ -0,0 +1,101 @@
+# shared parts of the gen_mfg_* footprint generators, which can be used as
+# scripts (writing their default footprint to stdout) or imported:
+#
+#   import gen_mfg_qfn
+#   with open("Maxim_TQFN-28.kicad_mod", "w") as f:
+#     gen_mfg_qfn.generate(gen_mfg_qfn.Params(PARTNAME="Maxim_TQFN-28", rotation=0), f)
+#
+# build() returns the footprint in memory, as a footprint_sexpr.Footprint.
+# See gen_footprints.py to generate a whole library from a table.
+import hashlib
+import json
+import numbers
+
+import footprint_sexpr
+
+# parameters are hashed at this precision, so 5.63 and 5.630000000000001
+# are the same footprint
+DIGEST_DECIMALS = 9
+
+def _digest_value(value):
+  # 90 and 90.0 too; adding 0.0 turns -0.0 into 0.0
+  if isinstance(value, numbers.Real) and not isinstance(value, bool):
+    return round(float(value), DIGEST_DECIMALS) + 0.0
+  return value
+
+class Params(object):
+  """Footprint parameters
+
+  Subclasses list the parameters and their defaults as class attributes;
+  keyword arguments override them. _generator names the generator in
+  digests, the same whether it's imported or run as a script.
+  """
+  _generator = None
+
+  def __init__(self, **kwargs):
+    names = self.names()
+    for name, value in kwargs.items():
+      if name not in names:
+        raise TypeError("unknown parameter {}".format(name))
+      setattr(self, name, value)
+
+  @classmethod
+  def names(cls):
+    """Returns the names of the parameters, in order"""
+    names = []
+    for klass in reversed(cls.__mro__):
+      for name, value in vars(klass).items():
+        if not name.startswith("_") and not callable(value) and \
+            not isinstance(value, classmethod) and name not in names:
+          names.append(name)
+    return names
+
+  def as_dict(self):
+    return dict((name, getattr(self, name)) for name in self.names())
+
+  def digest(self):
+    """Returns a hex hash of the generator and parameter values"""
+    values = dict((name, _digest_value(value)) for name, value in self.as_dict().items())
+    data = json.dumps([self._generator, values], sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+  def tedit(self):
+    """Returns the footprint's tedit, a 32-bit hex timestamp; it's derived
+    from the parameters, so regenerating a footprint doesn't change it"""
+    return self.digest()[:8].upper()
+
+  def __repr__(self):
+    return "{}({})".format(type(self).__name__,
+        ", ".join("{}={!r}".format(name, getattr(self, name)) for name in self.names()))
+
+def new_footprint(p):
+  """Returns a footprint for Params p with the texts every generator uses,
+  and nothing else yet"""
+  # the same parameters always give the same file
+  fp = footprint_sexpr.Footprint(p.PARTNAME, p.tedit())
+  fp.add(footprint_sexpr.Text("reference", "REF**", (0, 0), "F.SilkS"))
+  fp.add(footprint_sexpr.Text("user", "%R", (0, 0), "F.Fab"))
+  fp.add(footprint_sexpr.Text("value", "%V", (0, -0.5), "F.Fab", hide=True))
+  return fp
+
+def parse_value(text, default):
+  """Parses a table cell as the type of a parameter's default; an empty cell
+  means the default"""
+  text = text.strip()
+  if len(text) == 0:
+    return default
+  if text.lower() in ("none", "null"):
+    return None
+  if isinstance(default, bool):
+    if text.lower() in ("1", "true", "yes", "y"):
+      return True
+    if text.lower() in ("0", "false", "no", "n"):
+      return False
+    raise ValueError("expected true or false, not {}".format(text))
+  if isinstance(default, int):
+    # rotation = 45.5 is fine too
+    value = float(text)
+    return int(value) if value.is_integer() else value
+  if isinstance(default, float) or default is None:
+    return float(text)
+  return text
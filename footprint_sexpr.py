@@ -0,0 +1,147 @@
+# footprints in memory, and their KiCad s-expression files
+#
+# The gen_mfg_* generators build a Footprint out of Text, Line, Circle and
+# Pad items, and dumps() writes the whole file in one go, either as a KiCad
+# 5 (module ...) or as a KiCad 6+ (footprint ...). Every number is written
+# the same way: rounded to KiCad's 1 nm resolution, without trailing zeros,
+# so 2.8150000000000004 is 2.815 and -0.0 is 0.
+import functools
+import re
+
+# versions of KiCad whose footprint syntax can be written
+KICAD_VERSIONS = (5, 6)
+# file format version of the KiCad 6 syntax; KiCad 7 and later read it too
+FORMAT_VERSION = 20211014
+GENERATOR = "kicad_helpers"
+DECIMALS = 6
+
+_BARE_RE = re.compile(r'^[^\s()"\\]+$')
+
+# pad grids repeat the same few values over and over
+@functools.lru_cache(maxsize=1 << 16)
+def format_number(number):
+  """Formats a length, ratio or angle with fixed precision"""
+  text = "{:.{}f}".format(number, DECIMALS).rstrip("0").rstrip(".")
+  return "0" if text == "-0" else text
+
+@functools.lru_cache(maxsize=1 << 12)
+def quote(text, always=False):
+  """Returns text as an s-expression atom, quoted if needed or always"""
+  text = str(text)
+  if not always and _BARE_RE.match(text):
+    return text
+  return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class Text(object):
+  """fp_text; kind is reference, value or user"""
+  def __init__(self, kind, text, at, layer, hide=False, size=(1, 1), thickness=0.15):
+    self.kind = kind
+    self.text = text
+    self.at = at
+    self.layer = layer
+    self.hide = hide
+    self.size = size
+    self.thickness = thickness
+
+class Line(object):
+  """fp_line from start to end"""
+  def __init__(self, start, end, layer, width=0.15):
+    self.start = start
+    self.end = end
+    self.layer = layer
+    self.width = width
+
+class Circle(object):
+  """fp_circle around center, through end"""
+  def __init__(self, center, end, layer, width=0.15):
+    self.center = center
+    self.end = end
+    self.layer = layer
+    self.width = width
+
+class Pad(object):
+  """pad; shape is rect, roundrect, circle..."""
+  def __init__(self, number, shape, at, size, kind="smd", layers=("F.Cu", "F.Paste", "F.Mask"),
+      roundrect_rratio=None, solder_mask_margin=None):
+    self.number = number
+    self.shape = shape
+    self.at = at
+    self.size = size
+    self.kind = kind
+    self.layers = layers
+    self.roundrect_rratio = roundrect_rratio
+    self.solder_mask_margin = solder_mask_margin
+
+class Footprint(object):
+  """A footprint's items, in the order they're written"""
+  def __init__(self, name, tedit, layer="F.Cu"):
+    self.name = name
+    self.tedit = tedit
+    self.layer = layer
+    self.items = []
+
+  def add(self, item):
+    self.items.append(item)
+    return item
+
+  def lines(self, segments, layer, width=0.15):
+    """Adds a Line for each (start x, start y, end x, end y)"""
+    for (x1, y1, x2, y2) in segments:
+      self.items.append(Line((x1, y1), (x2, y2), layer, width))
+
+def _xy(name, point):
+  return "({} {} {})".format(name, format_number(point[0]), format_number(point[1]))
+
+@functools.lru_cache(maxsize=None)
+def _layers(layers, always_quote):
+  return " ".join(quote(layer, always_quote) for layer in layers)
+
+def _text(item, version):
+  hide = " hide" if item.hide else ""
+  return ("  (fp_text {} {} {} (layer {}){}\n"
+      "    (effects (font {} (thickness {})))\n"
+      "  )").format(item.kind, quote(item.text, version >= 6), _xy("at", item.at),
+        quote(item.layer, version >= 6), hide, _xy("size", item.size),
+        format_number(item.thickness))
+
+def _line(item, version):
+  return "  (fp_line {} {} (layer {}) (width {}))".format(_xy("start", item.start),
+      _xy("end", item.end), quote(item.layer, version >= 6), format_number(item.width))
+
+def _circle(item, version):
+  return "  (fp_circle {} {} (layer {}) (width {}))".format(_xy("center", item.center),
+      _xy("end", item.end), quote(item.layer, version >= 6), format_number(item.width))
+
+def _pad(item, version):
+  text = "  (pad {} {} {} (at {} {}) (size {} {}) (layers {})".format(
+      quote(item.number, version >= 6), item.kind, item.shape, format_number(item.at[0]),
+      format_number(item.at[1]), format_number(item.size[0]), format_number(item.size[1]),
+      _layers(tuple(item.layers), version >= 6))
+  if item.roundrect_rratio is not None:
+    text += " (roundrect_rratio {})".format(format_number(item.roundrect_rratio))
+  if item.solder_mask_margin is not None:
+    text += " (solder_mask_margin {})".format(format_number(item.solder_mask_margin))
+  return text + ")"
+
+_WRITERS = {Text: _text, Line: _line, Circle: _circle, Pad: _pad}
+
+def dumps(footprint, version=5):
+  """Returns a footprint's .kicad_mod file, in the syntax of a KiCad
+  version"""
+  if version not in KICAD_VERSIONS:
+    raise ValueError("can't write KiCad {} footprints, only {}".format(version,
+      ", ".join(str(v) for v in KICAD_VERSIONS)))
+  if version >= 6:
+    lines = ["(footprint {} (version {}) (generator {}) (layer {})".format(
+        quote(footprint.name, True), FORMAT_VERSION, GENERATOR, quote(footprint.layer, True)),
+      "  (tedit {})".format(footprint.tedit)]
+  else:
+    lines = ["(module {} (layer {}) (tedit {})".format(quote(footprint.name),
+        footprint.layer, footprint.tedit)]
+  lines.extend(_WRITERS[type(item)](item, version) for item in footprint.items)
+  lines.append(")\n")
+  return "\n".join(lines)
+
+def write(f, footprint, version=5):
+  """Writes a footprint's .kicad_mod file to f"""
+  f.write(dumps(footprint, version))
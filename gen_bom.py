@@ -2,24 +2,27 @@
 
 # (c) 2015 Productize <joost@productize.be>
 
-import sys, copy, collections, codecs
-from bs4 import BeautifulSoup
+import collections, argparse, os
+import concurrent.futures
+import csv
+import json
+import re
+import xml.etree.ElementTree as ET
 
-soup = BeautifulSoup(open(sys.argv[1]))
-
-date = soup.design.date.contents[0]
-
-comp = {}
-comp_nc = {}
+from values import canonical_value
 
 standard_fields = ['Reference','Identifier','Package','Value','Tolerance','Voltage','Current','Power','PN']
-extra_fields = []
+# per-reference lists, which are merged when grouping instead of compared
+list_fields = ['Reference', 'Board']
+# fields compared by their canonical form, so 4k7 and 4.7k are grouped
+value_fields = ['Value', 'Tolerance', 'Voltage', 'Current', 'Power']
 
-i = 1
-for c in soup.components.find_all("comp"):
+def new_component(ref, value, fields, extra_fields):
+  # dict of fields for a component, adding the names of any non-standard
+  # fields to extra_fields
   new_comp = collections.defaultdict(str)
-  new_comp['Reference'] = [c['ref']]
-  new_comp['Value'] = c.value.contents[0]
+  new_comp['Reference'] = [ref]
+  new_comp['Value'] = value
   new_comp['Identifier'] = ''
   new_comp['Package'] = ''
   new_comp['Tolerance'] = ''
@@ -27,45 +30,235 @@ for c in soup.components.find_all("comp"):
   new_comp['Current'] = ''
   new_comp['Power'] = ''
   new_comp['PN'] = ''
-  for f in c.find_all("field"):
-    new_comp[f['name']] = f.contents[0]
-    if f['name'] not in standard_fields:
-      if f['name'] not in extra_fields:
-        extra_fields.append(f['name'])
-  found = None
-  new_comp_no_ref = {}
-  for k in new_comp.keys():
-    if k != 'Reference':
-      new_comp_no_ref[k] = new_comp[k]
-  for c2 in comp.values():
-    c2_no_ref = {}
-    for k in c2.keys():
-      if k != 'Reference':
-        c2_no_ref[k] = c2[k]
-    if str(c2_no_ref) == str(new_comp_no_ref):
-      found = c2
-      c2['Reference'].append(c['ref'])
-      break
-  if found == None:
-    comp[i] = new_comp
-  i+=1
-
-
-with codecs.open(sys.argv[2],"w", encoding='utf-8') as f:
-  f.write("Reference,Quantity,Identifier,Package,Value,Tolerance,Voltage,Current,Power,PN")
-  for c in extra_fields:
-    f.write(","+c)
-  f.write('\r\n')
-  ordered = []
-  for k in comp.keys():
-    c = comp[k]
+  for name, text in fields:
+    new_comp[name] = text
+    if name not in standard_fields:
+      if name not in extra_fields:
+        extra_fields.append(name)
+  return new_comp
+
+def read_components(f, extra_fields):
+  # yields a dict of fields for each component in the netlist file f
+  # (see new_component), streaming it so each <comp> is dropped once it's
+  # read. Everything after <components>, including the much larger <nets>,
+  # is never read.
+  components = None
+  for event, elem in ET.iterparse(f, events=("start", "end")):
+    if event == "start":
+      if elem.tag == "components":
+        components = elem
+      continue
+    if elem.tag == "comp" and components is not None:
+      value = elem.find("value")
+      fields = [(field.get('name'), field.text or '') for field in elem.iter("field")]
+      yield new_component(elem.get('ref'), (value.text or '') if value is not None else '',
+          fields, extra_fields)
+      components.remove(elem)
+    elif elem.tag == "components":
+      return
+
+def read_components_soup(soup, extra_fields):
+  # same as read_components, but from a netlist loaded with BeautifulSoup
+  for c in soup.components.find_all("comp"):
+    # plain strings, so they don't drag the whole tree along when pickled
+    yield new_component(str(c['ref']), str(c.value.contents[0]),
+        [(str(f['name']), str(f.contents[0])) for f in c.find_all("field")], extra_fields)
+
+_CLASS_RE = re.compile(r'[^\d]*')
+
+def component_class(ref):
+  # the letters a reference starts with, e.g. C for C12 or board:C12
+  return _CLASS_RE.match(ref.rsplit(':', 1)[-1]).group(0)
+
+def group_key(comp):
+  # components of the same class with the same fields, apart from their
+  # reference, are grouped, so a 10u capacitor and inductor aren't
+  return (component_class(comp['Reference'][0]),) + tuple(sorted(
+      (k, canonical_value(v) if k in value_fields else v)
+      for k, v in comp.items() if k not in list_fields))
+
+def group_components(comps):
+  # returns the groups in the order they're first seen; each group is its
+  # first component, with the references of the rest added to it
+  groups = {}
+  for new_comp in comps:
+    key = group_key(new_comp)
+    found = groups.get(key)
+    if found is None:
+      groups[key] = new_comp
+    else:
+      for k in list_fields:
+        if k in new_comp:
+          found[k].extend(new_comp[k])
+  return list(groups.values())
+
+def read_board(filename, board=None, soup=False):
+  # returns (grouped components, extra fields) for a netlist; if board is
+  # given, references are prefixed with it and each component gets a
+  # 'Board' list, so boards can be told apart after merging
+  extra_fields = []
+  if soup:
+    from bs4 import BeautifulSoup
+    comp = group_components(label_board(
+        read_components_soup(BeautifulSoup(open(filename)), extra_fields), board))
+  else:
+    with open(filename, 'rb') as f:
+      comp = group_components(label_board(read_components(f, extra_fields), board))
+  return (comp, extra_fields)
+
+def label_board(comps, board):
+  for c in comps:
+    if board is not None:
+      c['Reference'] = [board + ':' + ref for ref in c['Reference']]
+      c['Board'] = [board]
+    yield c
+
+def read_boards(boards, jobs=None, soup=False):
+  # reads (board name, netlist) pairs in parallel, and returns the merged
+  # (grouped components, extra fields)
+  with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+    results = list(executor.map(read_board, [filename for (_, filename) in boards],
+        [board for (board, _) in boards], [soup]*len(boards)))
+  extra_fields = []
+  for (_, board_fields) in results:
+    for name in board_fields:
+      if name not in extra_fields:
+        extra_fields.append(name)
+  return (group_components(c for (comp, _) in results for c in comp), extra_fields)
+
+def parse_board(arg):
+  # NETLIST or NETLIST=QUANTITY; returns (board name, netlist, quantity)
+  filename, quantity = arg, 1
+  if '=' in arg and arg.rsplit('=', 1)[1].isdigit():
+    filename, quantity = arg.rsplit('=', 1)
+    quantity = int(quantity)
+  board = os.path.splitext(os.path.basename(filename))[0]
+  return (board, filename, quantity)
+
+def read_netlists(inputs, jobs=None, soup=False):
+  # reads netlist arguments (NETLIST or NETLIST=QUANTITY); returns (grouped
+  # components, extra fields, boards), where boards is None for a single
+  # netlist without a quantity, and a list of (board name, netlist,
+  # quantity) otherwise
+  boards = [parse_board(arg) for arg in inputs]
+  if len(boards) == 1 and inputs[0] == boards[0][1]:
+    (comp, extra_fields) = read_board(inputs[0], soup=soup)
+    return (comp, extra_fields, None)
+  names = [board for (board, _, _) in boards]
+  if len(set(names)) != len(names):
+    raise ValueError("board names (netlist file names without extension) must be unique")
+  (comp, extra_fields) = read_boards([(board, filename) for (board, filename, _) in boards],
+      jobs, soup)
+  return (comp, extra_fields, boards)
+
+def bom_rows(comp, extra_fields, boards=None):
+  # yields the BOM header and then a row per group, as lists of strings; if
+  # boards is a list of (board name, netlist, quantity), Quantity is the
+  # total for building every board that many times, and a column per board
+  # gives the count on one of that board
+  header = ['Reference', 'Quantity', 'Identifier', 'Package', 'Value', 'Tolerance', 'Voltage', 'Current', 'Power', 'PN']
+  header.extend(extra_fields)
+  if boards is not None:
+    header.extend("{} x{}".format(board, quantity) for (board, _, quantity) in boards)
+  yield header
+  for c in comp:
     ref = ';'.join(c['Reference'])
-    l = [ref, str(len(c['Reference'])), c['Identifier'], c['Package'], c['Value'], c['Tolerance'], c['Voltage'], c['Current'], c['Power'], c['PN']]
+    if boards is None:
+      quantity = len(c['Reference'])
+    else:
+      per_board = [c['Board'].count(board) for (board, _, _) in boards]
+      quantity = sum(n*q for n, (_, _, q) in zip(per_board, boards))
+    l = [ref, str(quantity), c['Identifier'], c['Package'], c['Value'], c['Tolerance'], c['Voltage'], c['Current'], c['Power'], c['PN']]
     for y in extra_fields:
       l.append(c[y])
+    if boards is not None:
+      l.extend(str(n) for n in per_board)
     #for y in c.keys():
     #  if y not in standard_fields:
     #    l.append
-    l = ['"'+x+'"' for x in l]
-    f.write(','.join(l))
-    f.write('\r\n')
+    yield l
+
+def write_csv(f, header, rows, counts):
+  writer = csv.writer(f, lineterminator='\r\n')
+  writer.writerow(header)
+  writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\r\n')
+  for l in rows:
+    writer.writerow(l)
+
+def write_jsonl(f, header, rows, counts):
+  # an object per group, with counts as numbers
+  for l in rows:
+    f.write(json.dumps(collections.OrderedDict(
+        (name, int(x) if i in counts else x) for i, (name, x) in enumerate(zip(header, l)))))
+    f.write('\n')
+
+# rows per row group of the columnar format
+COLUMNAR_GROUP_ROWS = 1024
+
+def write_columnar(f, header, rows, counts):
+  # a JSON header line, then one line per row group, each holding a list of
+  # values per column; see read_columnar
+  f.write(json.dumps({"format": "kicad-helpers-bom", "version": 1, "columns": header,
+      "counts": sorted(counts)}))
+  f.write('\n')
+  group = []
+  for l in rows:
+    group.append([int(x) if i in counts else x for i, x in enumerate(l)])
+    if len(group) == COLUMNAR_GROUP_ROWS:
+      f.write(json.dumps([list(column) for column in zip(*group)]))
+      f.write('\n')
+      group = []
+  if len(group) > 0:
+    f.write(json.dumps([list(column) for column in zip(*group)]))
+    f.write('\n')
+
+def read_columnar(f):
+  # returns {column name: list of values} for a BOM in the columnar format
+  header = json.loads(f.readline())
+  columns = collections.OrderedDict((name, []) for name in header["columns"])
+  for line in f:
+    for name, values in zip(header["columns"], json.loads(line)):
+      columns[name].extend(values)
+  return columns
+
+# output formats by name, each written row by row as groups are formatted
+BOM_FORMATS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "columnar": write_columnar,
+}
+BOM_EXTENSIONS = {".jsonl": "jsonl", ".bomc": "columnar"}
+
+def write_bom(f, comp, extra_fields, boards=None, fmt="csv"):
+  rows = bom_rows(comp, extra_fields, boards)
+  header = next(rows)
+  # Quantity, and the per-board columns after the fields
+  counts = set([1]) | set(range(len(standard_fields) + 1 + len(extra_fields), len(header)))
+  BOM_FORMATS[fmt](f, header, rows, counts)
+
+def main():
+  parser = argparse.ArgumentParser(description="Generates a grouped BOM from Eeschema XML netlists")
+  parser.add_argument("--soup", action="store_true",
+      help="load netlists with BeautifulSoup instead of streaming them")
+  parser.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to read netlists (default: number of CPUs)")
+  parser.add_argument("input", nargs="+", help="input netlists, as NETLIST or NETLIST=QUANTITY; "
+      "giving several or a quantity makes a merged BOM with a column per board")
+  parser.add_argument("output", help="output BOM")
+  parser.add_argument("-f", "--format", choices=sorted(BOM_FORMATS),
+      help="output format (default: from the output extension, {}, or csv)".format(
+        ", ".join("{} for {}".format(fmt, ext) for ext, fmt in sorted(BOM_EXTENSIONS.items()))))
+
+  args = parser.parse_args()
+
+  try:
+    (comp, extra_fields, boards) = read_netlists(args.input, args.jobs, args.soup)
+  except ValueError as e:
+    parser.error(str(e))
+
+  fmt = args.format or BOM_EXTENSIONS.get(os.path.splitext(args.output)[1], "csv")
+  with open(args.output, "w", encoding='utf-8', newline='') as f:
+    write_bom(f, comp, extra_fields, boards, fmt)
+
+if __name__ == "__main__":
+  main()
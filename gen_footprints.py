@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# generates a footprint library (a .pretty directory of .kicad_mod files)
+# from a table of packages, one per row
+#
+# The table is a JSON list of objects, or a CSV file with a header row. Each
+# package has a "type" (one of GENERATORS), and any of that generator's
+# Params; PARTNAME, which names the file, is required, and anything missing
+# or empty takes the generator's default, so a CSV table can have columns
+# for every type.
+#
+# QFN and VSSOP packages can give their datasheet dimensions instead of Z, G
+# and w: the lead span, terminal length and width (ipc7351.DIMENSIONS) and
+# optionally the body (D1_min, D1_max, E1_min, E1_max), lead type and
+# density level. Their IPC-7351 land patterns are computed for the whole
+# table at once.
+#
+# Rebuilds are incremental: the library's manifest records a hash of each
+# footprint's parameters and generator source, and footprints whose hash
+# hasn't changed aren't generated again.
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import importlib
+import json
+import os
+
+import numpy as np
+
+import footprint_lib
+import footprint_sexpr
+import ipc7351
+
+# package types, and the modules generating them
+GENERATORS = {
+    "bga": "gen_mfg_bga",
+    "lga": "gen_mfg_lga",
+    "qfn": "gen_mfg_qfn",
+    "vssop": "gen_mfg_vssop",
+}
+
+# package types whose land patterns can be computed, and their lead types
+# unless a row has a lead column
+LEADS = {
+    "qfn": "no_lead",
+    "vssop": "gull_wing",
+}
+BODY_DIMENSIONS = ["D1_min", "D1_max", "E1_min", "E1_max"]
+# columns used to compute land patterns, which aren't generator parameters
+LAND_PATTERN_COLUMNS = ipc7351.DIMENSIONS + BODY_DIMENSIONS + ["lead", "density"]
+
+def read_table(filename):
+  """Returns the rows of a JSON or CSV package table, as dicts"""
+  with open(filename, 'r') as f:
+    if filename.endswith(".json"):
+      return json.load(f)
+    return [row for row in csv.DictReader(f) if any(v.strip() for v in row.values() if v)]
+
+def _cell(row, name):
+  value = row.get(name)
+  return "" if value is None else str(value).strip()
+
+def _number(row, name, default=None):
+  text = _cell(row, name)
+  if len(text) == 0 and default is not None:
+    return default
+  try:
+    return float(text)
+  except ValueError:
+    raise ValueError("{} should be a number, not {!r}".format(name, text))
+
+def add_land_patterns(rows, density="B"):
+  """Returns the rows of a package table with their datasheet dimensions
+  replaced by the generator parameters they give (Z, G, w, M3, and the
+  nominal H, b, L1, D1 and E1); parameters a row already has are kept"""
+  rows = [dict(row) for row in rows]
+  todo = []
+  for i, row in enumerate(rows, 1):
+    given = [c for c in ipc7351.DIMENSIONS if _cell(row, c)]
+    if len(given) == 0:
+      continue
+    if len(given) < len(ipc7351.DIMENSIONS):
+      raise ValueError("row {}: land patterns need all of {}".format(i, ", ".join(ipc7351.DIMENSIONS)))
+    kind = _cell(row, "type").lower()
+    if kind not in LEADS:
+      raise ValueError("row {}: land patterns can't be computed for {!r} packages, only {}".format(
+        i, kind, ", ".join(sorted(LEADS))))
+    todo.append(i - 1)
+
+  if len(todo) > 0:
+    defaults = [importlib.import_module(GENERATORS[_cell(rows[i], "type").lower()]).Params
+        for i in todo]
+    try:
+      columns = dict((c, np.array([_number(rows[i], c) for i in todo])) for c in ipc7351.DIMENSIONS)
+      pitch = [_number(rows[i], "C", p.C) for i, p in zip(todo, defaults)]
+      lead = np.array([_cell(rows[i], "lead") or LEADS[_cell(rows[i], "type").lower()] for i in todo])
+      levels = [(_cell(rows[i], "density") or density).upper() for i in todo]
+      pattern = ipc7351.land_pattern(lead=lead, density=levels, pitch=pitch, **columns)
+    except ValueError as e:
+      raise ValueError("land patterns: {}".format(e))
+    crowded = np.flatnonzero(pattern["G"] <= 0)
+    if len(crowded) > 0:
+      raise ValueError("row {}: no room between the pads of its land pattern".format(
+        todo[crowded[0]] + 1))
+
+    params = {"Z": pattern["Z"], "G": pattern["G"], "w": pattern["X"],
+        "M3": pattern["courtyard"],
+        "H": (columns["L_min"] + columns["L_max"])/2,
+        "b": (columns["W_min"] + columns["W_max"])/2}
+    for body in ["D1", "E1"]:
+      limits = [(_cell(rows[i], body + "_min"), _cell(rows[i], body + "_max")) for i in todo]
+      params[body] = np.array([(float(lo) + float(hi))/2 if lo and hi else
+          _number(rows[i], body, getattr(p, body)) for i, p, (lo, hi) in zip(todo, defaults, limits)])
+    # fab layer leads: no-lead terminals are drawn inside the body, and
+    # gull wings from the body out to their tips
+    terminal = (columns["T_min"] + columns["T_max"])/2
+    params["L1"] = np.where(lead == "no_lead", -terminal, (params["H"] - params["D1"])/2)
+
+    for j, i in enumerate(todo):
+      for name, values in params.items():
+        if not _cell(rows[i], name):
+          rows[i][name] = round(float(values[j]), 6)
+
+  for row in rows:
+    for name in LAND_PATTERN_COLUMNS:
+      row.pop(name, None)
+  return rows
+
+def package_params(row):
+  """Returns (generator module, Params) for a table row"""
+  row = dict(row)
+  kind = str(row.pop("type", "")).strip().lower()
+  if kind not in GENERATORS:
+    raise ValueError("unknown package type {!r}, expected one of {}".format(
+      kind, ", ".join(sorted(GENERATORS))))
+  module = importlib.import_module(GENERATORS[kind])
+  names = module.Params.names()
+  params = dict()
+  for name, value in row.items():
+    if isinstance(value, str) and len(value.strip()) == 0:
+      # CSV columns used by other package types
+      continue
+    if name not in names:
+      raise ValueError("unknown {} parameter {!r}".format(kind, name))
+    if isinstance(value, str):
+      value = footprint_lib.parse_value(value, getattr(module.Params, name))
+    params[name] = value
+  if not params.get("PARTNAME"):
+    raise ValueError("PARTNAME is required")
+  return (module, module.Params(**params))
+
+MANIFEST = ".manifest.json"
+# bump whenever generation changes outside the generator modules, to rebuild
+# every footprint
+MANIFEST_VERSION = 3
+
+_source_hashes = dict()
+
+def source_hash(module):
+  """Returns a hash of a generator module's source, so editing it rebuilds
+  its footprints"""
+  if module.__name__ not in _source_hashes:
+    with open(module.__file__, 'rb') as f:
+      _source_hashes[module.__name__] = hashlib.sha256(f.read()).hexdigest()
+  return _source_hashes[module.__name__]
+
+def build_hash(module, params, version):
+  """Returns the manifest hash of a footprint written for a KiCad version"""
+  data = "{} {} {} {}".format(MANIFEST_VERSION, version, source_hash(module), params.digest())
+  return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def read_manifest(output_dir):
+  """Returns {PARTNAME: build hash} of a library's footprints"""
+  try:
+    with open(os.path.join(output_dir, MANIFEST), 'r') as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return dict()
+
+def write_manifest(output_dir, manifest):
+  filename = os.path.join(output_dir, MANIFEST)
+  with open(filename + ".tmp", 'w') as f:
+    json.dump(manifest, f, indent=0, sort_keys=True)
+  os.replace(filename + ".tmp", filename)
+
+def build_footprint(row, output_dir, version=5):
+  """Writes the footprint for a table row into output_dir, in the syntax of
+  a KiCad version; returns its file name"""
+  (module, params) = package_params(row)
+  filename = os.path.join(output_dir, params.PARTNAME + ".kicad_mod")
+  with open(filename, 'w') as f:
+    footprint_sexpr.write(f, module.build(params), version)
+  return filename
+
+def main():
+  parser = argparse.ArgumentParser(description="Generates a footprint library from a table of packages")
+  parser.add_argument("table", help="package table, as JSON (.json) or CSV")
+  parser.add_argument("output", help="output library directory, e.g. mfg.pretty; created if needed")
+  parser.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to generate footprints (default: number of CPUs)")
+  parser.add_argument("--force", action="store_true",
+      help="generate every footprint, even if it's unchanged")
+  parser.add_argument("-d", "--density", default="B", choices=list(ipc7351.DENSITIES),
+      help="IPC-7351 density level of computed land patterns, for rows without a density column: "
+        "A (most), B (nominal) or C (least) (default: %(default)s)")
+  parser.add_argument("-k", "--kicad", type=int, choices=footprint_sexpr.KICAD_VERSIONS, default=5,
+      help="KiCad version whose footprint syntax is written: 5 for (module ...), 6 for "
+        "(footprint ...), which KiCad 7 and later read too (default: %(default)s)")
+
+  args = parser.parse_args()
+
+  try:
+    rows = add_land_patterns(read_table(args.table), args.density)
+  except ValueError as e:
+    parser.error(str(e))
+  # check the whole table before writing anything
+  names = dict()
+  manifest = dict()
+  for i, row in enumerate(rows, 1):
+    try:
+      (module, params) = package_params(row)
+    except (ValueError, TypeError) as e:
+      parser.error("row {}: {}".format(i, e))
+    if params.PARTNAME in names:
+      parser.error("row {}: PARTNAME {} is also used by row {}".format(i, params.PARTNAME,
+        names[params.PARTNAME]))
+    names[params.PARTNAME] = i
+    manifest[params.PARTNAME] = build_hash(module, params, args.kicad)
+
+  if not os.path.isdir(args.output):
+    os.makedirs(args.output)
+  old_manifest = read_manifest(args.output)
+  todo = [rows[i - 1] for name, i in names.items() if args.force or
+      old_manifest.get(name) != manifest[name] or
+      not os.path.exists(os.path.join(args.output, name + ".kicad_mod"))]
+
+  if args.jobs == 1 or len(todo) <= 1:
+    # not worth starting processes
+    filenames = [build_footprint(row, args.output, args.kicad) for row in todo]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+      filenames = list(executor.map(build_footprint, todo, [args.output]*len(todo),
+          [args.kicad]*len(todo), chunksize=max(1, len(todo) // 64)))
+
+  # footprints this library generated that are no longer in the table
+  removed = [name for name in old_manifest if name not in manifest]
+  for name in removed:
+    filename = os.path.join(args.output, name + ".kicad_mod")
+    if os.path.exists(filename):
+      os.remove(filename)
+  write_manifest(args.output, manifest)
+  print("{} footprints written, {} unchanged, {} removed from {}".format(len(filenames),
+      len(rows) - len(filenames), len(removed), args.output))
+
+if __name__ == "__main__":
+  main()
@@ -2,54 +2,27 @@
 import argparse
 import csv
 
+import gen_orders
+
 def main():
   parser = argparse.ArgumentParser(description="Generates a Mouser BOM from Joost's KiCAD BOM")
   parser.add_argument("input", help="input BOM")
   parser.add_argument("output", help="output BOM")
   parser.add_argument("--m", help="quantity multiplier", default="1")
+  parser.add_argument("--overage", type=float, default=0, metavar="PERCENT",
+      help="extra parts to buy per BOM line, unless the line has an Overage column (default: 0)")
+  parser.add_argument("--min-qty", type=int, default=0, metavar="N",
+      help="minimum quantity to order of each part (default: 0)")
 
   args = parser.parse_args()
   multiplier = 1 if args.m is None else int(args.m)
 
   print("multiplier: {}".format(multiplier))
 
-  mouser_idx = None
-  count_idx = None
-  components = []
-  with open(args.input, 'r') as f:
-    reader = csv.reader(f)
-    parts = next(reader)
-    for i, part in enumerate(parts):
-      if 'Mouser' == part.strip():
-        mouser_idx = i
-      elif 'Quantity' == part.strip():
-        count_idx = i
-
-    if mouser_idx is None or count_idx is None:
-      print("Unable to find headers")
-      return
-
-    for i, parts in enumerate(reader):
-      if len(parts) < max(mouser_idx, count_idx):
-        print("[WARN] line {} is missing fields".format(i + 1))
-        continue
-      part_num = parts[mouser_idx]
-      count = parts[count_idx]
-      if len(part_num) == 0:
-        print("[WARN] line {} is missing part number".format(i + 1))
-        print(parts)
-        continue
-      if count == 0:
-        print("[WARN] line {} has zero quantity".format(i + 1))
-      if part_num == 'NoPart':
-        continue
-      components.append((part_num, count))
-
-  with open(args.output, 'w') as f:
-    # header is necessary if you don't want to miss the first part
-    f.write("Mouser,Quantity\n")
-    for c in components:
-      f.write("{},{}\n".format(c[0], multiplier*int(c[1])))
+  # see gen_orders.py to write the orders for every distributor at once
+  with open(args.input, 'r') as f, open(args.output, 'w') as out:
+    gen_orders.export_orders(csv.reader(f), {"mouser": out}, multiplier,
+        args.overage, args.min_qty)
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# generates order uploads for every distributor at once, from a grouped BOM
+# (use gen_bom.py to generate it) or straight from netlists
+import argparse
+import collections
+import csv
+import math
+import os
+
+import gen_bom
+
+class DistributorFormat(object):
+  """Where a distributor's part numbers are in a BOM, and how its order
+  upload file is written"""
+  def __init__(self, name, columns, header, row, start=None):
+    self.name = name
+    # BOM columns holding the part numbers, in order of preference
+    self.columns = columns
+    # text in the row where the BOM's table starts, if it has several; e.g.
+    # grouped BOMs list individual components before the collated ones
+    self.start = start
+    # header is necessary if you don't want to miss the first part
+    self.header = header
+    # formatted with the part number and quantity
+    self.row = row
+
+# adding a distributor only needs an entry here
+DISTRIBUTORS = {
+    "digikey": DistributorFormat("Digikey", ["Digikey"], "Digikey,Quantity\n", "\"{}\",{}\n",
+      start="Collated"),
+    "mouser": DistributorFormat("Mouser", ["Mouser"], "Mouser,Quantity\n", "{},{}\n"),
+}
+
+# BOM columns holding the quantity, in order of preference
+QUANTITY_COLUMNS = ["Quantity", "Qty"]
+# optional BOM column with a per-line overage percentage, overriding the
+# default one (e.g. more for 0201 passives that get lost in the feeder)
+OVERAGE_COLUMNS = ["Overage", "Attrition"]
+
+def order_quantity(count, multiplier=1, overage=0):
+  """Parts to buy for one BOM line: count for each of multiplier boards,
+  plus overage percent extra, rounded up"""
+  needed = multiplier*count
+  # rounded first so e.g. 10% of 10 isn't bumped to 12 by float error
+  return int(math.ceil(round(needed*(100 + overage)/100.0, 6)))
+
+def find_columns(row, names):
+  """Returns (quantity index, {distributor: part number index}) for a BOM
+  row, or None if it isn't the header"""
+  parts = [part.strip() for part in row]
+  count_idx = None
+  for column in QUANTITY_COLUMNS:
+    if column in parts:
+      count_idx = parts.index(column)
+      break
+  part_idx = dict()
+  for name in names:
+    for column in DISTRIBUTORS[name].columns:
+      if column in parts:
+        part_idx[name] = parts.index(column)
+        break
+  if count_idx is None or len(part_idx) == 0:
+    return None
+  return (count_idx, part_idx)
+
+def read_demand(rows, names, overage=0):
+  """Reads what each distributor's part numbers are needed for, from the
+  rows of a BOM in one pass
+
+  Rows before the header (the first row with a quantity column and a part
+  number column) are skipped, so summaries above the table are fine. A row
+  containing a distributor's start text (e.g. "Collated" for Digikey)
+  starts the table over, and everything read before it is dropped. Rows
+  whose quantity isn't a whole number are skipped.
+  Returns {distributor: {part number: [(count, overage percent), ...]}},
+  with a (count per board, overage) pair for each BOM line using the part,
+  in the order parts are first seen; or None if there's no header. Lines
+  without their own Overage column use the default overage.
+  """
+  starts = set(DISTRIBUTORS[name].start for name in names) - set([None])
+  columns = None
+  demand = None
+  for line_number, row in enumerate(rows, 1):
+    if any(start in part for start in starts for part in row):
+      columns = None
+      continue
+    if columns is None:
+      columns = find_columns(row, names)
+      if columns is None:
+        continue
+      (count_idx, part_idx) = columns
+      header = [part.strip() for part in row]
+      overage_idx = None
+      for column in OVERAGE_COLUMNS:
+        if column in header:
+          overage_idx = header.index(column)
+          break
+      demand = dict()
+      for name in names:
+        if name not in part_idx:
+          print("[WARN] no {} column found".format(DISTRIBUTORS[name].name))
+          continue
+        demand[name] = collections.OrderedDict()
+      continue
+
+    if len(row) <= count_idx:
+      print("[WARN] line {} is missing fields".format(line_number))
+      continue
+    try:
+      count = int(row[count_idx])
+    except ValueError:
+      print("[WARN] line {} has no quantity".format(line_number))
+      continue
+    if count == 0:
+      print("[WARN] line {} has zero quantity".format(line_number))
+    line_overage = overage
+    if overage_idx is not None and overage_idx < len(row) and row[overage_idx].strip():
+      line_overage = float(row[overage_idx].strip().rstrip('%'))
+    for name, idx in part_idx.items():
+      fmt = DISTRIBUTORS[name]
+      part_num = row[idx].strip() if idx < len(row) else ""
+      if len(part_num) == 0:
+        print("[WARN] line {} is missing {} part number".format(line_number, fmt.name))
+        continue
+      if part_num == 'NoPart':
+        continue
+      demand[name].setdefault(part_num, []).append((count, line_overage))
+  if demand is None:
+    print("Unable to find headers")
+  return demand
+
+def part_quantity(lines, multiplier=1, minimum=0):
+  """Parts to buy of a part number used on several BOM lines, each a (count,
+  overage) pair; at least minimum, unless none are needed"""
+  quantity = sum(order_quantity(count, multiplier, overage) for (count, overage) in lines)
+  if quantity > 0:
+    quantity = max(quantity, minimum)
+  return quantity
+
+def write_orders(demand, outputs, multiplier=1, minimum=0, catalog=None):
+  """Writes order uploads for demand, as returned by read_demand
+
+  outputs maps distributor names (keys of DISTRIBUTORS) to open files. Each
+  line's quantity gets the multiplier and overage applied, then lines with
+  the same part number are merged into one order line of at least minimum
+  parts. If a pricing.PriceCatalog is given, quantities are raised to the
+  next price break whenever that's cheaper, and the total cost is printed.
+  Returns the number of order lines written per distributor.
+  """
+  written = dict()
+  for name, parts in demand.items():
+    fmt = DISTRIBUTORS[name]
+    outputs[name].write(fmt.header)
+    total = 0.0
+    unpriced = 0
+    for part_num, lines in parts.items():
+      quantity = part_quantity(lines, multiplier, minimum)
+      if catalog is not None:
+        best = catalog.best_quantity(part_num, quantity)
+        if best is None:
+          unpriced += 1
+        else:
+          minimum_break = catalog.breaks(part_num)[0][0]
+          if best[0] == minimum_break and quantity < minimum_break:
+            print("[INFO] {} {}: buying {} instead of {}, the minimum quantity".format(
+              fmt.name, part_num, best[0], quantity))
+          elif best[0] != quantity:
+            print("[INFO] {} {}: buying {} instead of {} is cheaper".format(
+              fmt.name, part_num, best[0], quantity))
+          (quantity, cost) = best
+          total += cost
+      outputs[name].write(fmt.row.format(part_num, quantity))
+    written[name] = len(parts)
+    if catalog is not None:
+      print("{} total cost: {:.2f}{}".format(fmt.name, total,
+        " ({} parts not in catalog)".format(unpriced) if unpriced else ""))
+  return written
+
+def export_orders(rows, outputs, multiplier=1, overage=0, minimum=0, catalog=None):
+  """Writes order uploads from the rows of a BOM in one pass
+
+  outputs maps distributor names (keys of DISTRIBUTORS) to open files; the
+  overage is a percentage, unless a line has its own Overage column (see
+  read_demand and write_orders). Returns the number of order lines written
+  per distributor, or None if there's no header.
+  """
+  demand = read_demand(rows, outputs, overage)
+  if demand is None:
+    return None
+  return write_orders(demand, outputs, multiplier, minimum, catalog)
+
+def main():
+  parser = argparse.ArgumentParser(description="Generates order uploads for all distributors from a grouped BOM")
+  parser.add_argument("input", nargs="+", help="input BOM, or netlists with --netlist")
+  parser.add_argument("--m", help="quantity multiplier", default="1")
+  parser.add_argument("--overage", type=float, default=0, metavar="PERCENT",
+      help="extra parts to buy per BOM line, unless the line has an Overage column (default: 0)")
+  parser.add_argument("--min-qty", type=int, default=0, metavar="N",
+      help="minimum quantity to order of each part, e.g. a cut tape or reel size (default: 0)")
+  parser.add_argument("--catalog", metavar="FILE",
+      help="price break catalog (CSV or SQLite, see pricing.py); quantities are raised to the next "
+      "price break when that's cheaper, and the total cost is printed")
+  parser.add_argument("-n", "--netlist", action="store_true",
+      help="read Eeschema XML netlists (as NETLIST or NETLIST=QUANTITY, like gen_bom.py) "
+      "and group them in memory, instead of reading a BOM")
+  parser.add_argument("-j", "--jobs", type=int, default=None,
+      help="number of processes used to read netlists (default: number of CPUs)")
+  parser.add_argument("-o", "--output-prefix",
+      help="prefix for output files, which are named PREFIX_DISTRIBUTOR.csv (default: input without extension)")
+  for name in sorted(DISTRIBUTORS):
+    parser.add_argument("--" + name, metavar="FILE",
+        help="output {} order to FILE; if no distributor is given, all of them are written".format(
+          DISTRIBUTORS[name].name))
+
+  args = parser.parse_args()
+  multiplier = 1 if args.m is None else int(args.m)
+  if not args.netlist and len(args.input) > 1:
+    parser.error("only one BOM can be read; use --netlist to merge netlists")
+
+  print("multiplier: {}".format(multiplier))
+
+  filenames = dict((name, getattr(args, name)) for name in DISTRIBUTORS
+      if getattr(args, name) is not None)
+  if len(filenames) == 0:
+    prefix = args.output_prefix or os.path.splitext(args.input[0].rsplit('=', 1)[0])[0]
+    filenames = dict((name, "{}_{}.csv".format(prefix, name)) for name in DISTRIBUTORS)
+
+  catalog = None
+  if args.catalog is not None:
+    import pricing
+    try:
+      catalog = pricing.PriceCatalog(args.catalog)
+    except ValueError as e:
+      parser.error(str(e))
+
+  outputs = dict()
+  written = None
+  try:
+    if args.netlist:
+      try:
+        (comp, extra_fields, boards) = gen_bom.read_netlists(args.input, args.jobs)
+      except ValueError as e:
+        parser.error(str(e))
+      demand = read_demand(gen_bom.bom_rows(comp, extra_fields, boards), filenames, args.overage)
+    else:
+      with open(args.input[0], 'r') as f:
+        demand = read_demand(csv.reader(f), filenames, args.overage)
+    if demand is not None:
+      # only distributors the BOM has a column for get a file
+      for name in demand:
+        outputs[name] = open(filenames[name], 'w')
+      written = write_orders(demand, outputs, multiplier, args.min_qty, catalog)
+  finally:
+    for output in outputs.values():
+      output.close()
+    if catalog is not None:
+      catalog.close()
+
+  if written is not None:
+    for name in sorted(written):
+      print("{}: {} parts written to {}".format(DISTRIBUTORS[name].name, written[name], filenames[name]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# IPC-7351 land patterns, from the package dimensions in a datasheet
+#
+# A package's leads are described by their span L (toe to toe, across the
+# package), terminal length T and terminal width W, each as min and max.
+# With the toe, heel and side fillet goals (JT, JH, JS) of the lead type and
+# density level (A: most material, B: nominal, C: least), the pads are
+#
+#   Z = Lmin + 2*JT + sqrt(CL^2 + F^2 + P^2)   across the outer pad edges
+#   G = Smax - 2*JH - sqrt(CS^2 + F^2 + P^2)   across the inner pad edges
+#   X = Wmin + 2*JS + sqrt(CW^2 + F^2 + P^2)   pad width
+#
+# where C* are the tolerances (max - min), S is the span between the heels
+# (with its tolerance taken as the RMS of L's and T's, as IPC-7351 does),
+# and F and P are the board fabrication and part placement tolerances. Z
+# and X are rounded up and G down to the round-off.
+#
+# Everything works on numpy arrays, so a whole catalog is computed at once;
+# gen_footprints.py uses it for package tables with these dimensions.
+import argparse
+import csv
+
+import numpy as np
+
+# (toe, heel, side) fillet goals, by lead type and density level
+FILLETS = {
+    "gull_wing": {"A": (0.55, 0.45, 0.05), "B": (0.35, 0.35, 0.03), "C": (0.15, 0.25, 0.01)},
+    # QFN, DFN, SON...
+    "no_lead": {"A": (0.40, 0.00, -0.04), "B": (0.30, 0.00, -0.04), "C": (0.20, 0.00, -0.04)},
+}
+# gull wings at this pitch or finer have smaller side fillets
+FINE_PITCH = 0.625
+FINE_PITCH_SIDES = {"A": 0.01, "B": -0.02, "C": -0.04}
+# courtyard excess around the pads and body, by density level
+COURTYARD = {"A": 0.5, "B": 0.25, "C": 0.1}
+DENSITIES = "ABC"
+
+FABRICATION = 0.05
+PLACEMENT = 0.025
+ROUND_OFF = 0.05
+
+# columns read from a table: the min and max of each dimension
+DIMENSIONS = ["L_min", "L_max", "T_min", "T_max", "W_min", "W_max"]
+# columns written
+RESULTS = ["Z", "G", "X", "pad_length", "pad_spacing", "courtyard"]
+
+def _lookup(names, table, what):
+  names = np.asarray(names)
+  unknown = sorted(set(names.ravel()) - set(table))
+  if unknown:
+    raise ValueError("unknown {} {}, expected one of {}".format(what, ", ".join(unknown),
+      ", ".join(sorted(table))))
+  return names
+
+def round_up(x, step):
+  # rounding to 1e-6 first keeps 1.2000000000000002 from becoming 1.25
+  return np.round(np.ceil(np.round(x/step, 6))*step, 6)
+
+def round_down(x, step):
+  return np.round(np.floor(np.round(x/step, 6))*step, 6)
+
+def land_pattern(L_min, L_max, T_min, T_max, W_min, W_max, lead="gull_wing", density="B",
+    pitch=np.inf, fabrication=FABRICATION, placement=PLACEMENT, round_off=ROUND_OFF):
+  """Returns a dict of arrays: Z, G and X, the pads' length and center to
+  center spacing across the package, and the courtyard excess
+
+  Every argument can be an array (or a scalar shared by every package); a
+  gull wing's pitch picks its side fillet. Packages whose leads are too
+  short for the fillets get a G of 0 or less.
+  """
+  (L_min, L_max, T_min, T_max, W_min, W_max, pitch) = np.broadcast_arrays(
+      *[np.asarray(v, dtype=np.float64) for v in (L_min, L_max, T_min, T_max, W_min, W_max, pitch)])
+  lead = np.broadcast_to(_lookup(lead, FILLETS, "lead type"), L_min.shape)
+  density = np.broadcast_to(_lookup(density, COURTYARD, "density level"), L_min.shape)
+
+  (toe, heel, side, courtyard) = [np.zeros(L_min.shape) for _ in range(4)]
+  for name, levels in FILLETS.items():
+    for level, (jt, jh, js) in levels.items():
+      rows = (lead == name) & (density == level)
+      toe[rows] = jt
+      heel[rows] = jh
+      side[rows] = js
+  for level, sides in FINE_PITCH_SIDES.items():
+    side[(lead == "gull_wing") & (density == level) & (pitch <= FINE_PITCH)] = sides
+  for level, excess in COURTYARD.items():
+    courtyard[density == level] = excess
+
+  CL = L_max - L_min
+  CT = T_max - T_min
+  CW = W_max - W_min
+  S_min = L_min - 2*T_max
+  S_max = L_max - 2*T_min
+  CS = np.sqrt(CL**2 + 2*CT**2)
+  S_max = S_max - ((S_max - S_min) - CS)/2
+  board = fabrication**2 + placement**2
+
+  Z = round_up(L_min + 2*toe + np.sqrt(CL**2 + board), round_off)
+  G = round_down(S_max - 2*heel - np.sqrt(CS**2 + board), round_off)
+  X = round_up(W_min + 2*side + np.sqrt(CW**2 + board), round_off)
+  return {"Z": Z, "G": G, "X": X, "pad_length": np.round((Z - G)/2, 6),
+      "pad_spacing": np.round((Z + G)/2, 6), "courtyard": courtyard}
+
+def main():
+  parser = argparse.ArgumentParser(description="Computes IPC-7351 land patterns for a table of packages")
+  parser.add_argument("input", help="input CSV, with columns " + ", ".join(DIMENSIONS) +
+      ", and optionally lead, density and pitch")
+  parser.add_argument("output", help="output CSV: the input, with columns " + ", ".join(RESULTS))
+  parser.add_argument("-l", "--lead", default="gull_wing", choices=sorted(FILLETS),
+      help="lead type of packages without a lead column (default: %(default)s)")
+  parser.add_argument("-d", "--density", default="B", choices=list(DENSITIES),
+      help="density level of packages without a density column: A (most), B (nominal) "
+        "or C (least) (default: %(default)s)")
+  parser.add_argument("--round", type=float, default=ROUND_OFF,
+      help="round-off of pad dimensions (default: %(default)s)")
+
+  args = parser.parse_args()
+
+  with open(args.input, 'r') as f:
+    reader = csv.DictReader(f)
+    fieldnames = reader.fieldnames
+    rows = list(reader)
+  missing = [c for c in DIMENSIONS if c not in fieldnames]
+  if missing:
+    parser.error("{} has no {} column".format(args.input, ", ".join(missing)))
+
+  try:
+    dimensions = [np.array([float(row[c]) for row in rows]) for c in DIMENSIONS]
+  except ValueError as e:
+    parser.error(str(e))
+  lead = [row.get("lead") or args.lead for row in rows]
+  density = [(row.get("density") or args.density).upper() for row in rows]
+  pitch = [float(row.get("pitch") or np.inf) for row in rows]
+  try:
+    pattern = land_pattern(*dimensions, lead=lead, density=density, pitch=pitch,
+        round_off=args.round)
+  except ValueError as e:
+    parser.error(str(e))
+  for i in np.flatnonzero(pattern["G"] <= 0):
+    print("[WARN] row {}: no room between the pads".format(i + 1))
+
+  with open(args.output, 'w', newline='') as f:
+    writer = csv.writer(f)
+    fieldnames = [c for c in fieldnames if c not in RESULTS]
+    writer.writerow(fieldnames + RESULTS)
+    columns = [pattern[c].tolist() for c in RESULTS]
+    for i, row in enumerate(rows):
+      writer.writerow([row[c] for c in fieldnames] +
+          ["{:g}".format(column[i]) for column in columns])
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# offline price breaks for distributor part numbers, used to pick order
+# quantities and to quote the cost of building a range of board quantities
+#
+# The catalog is a CSV file with Part, Quantity and Price columns (one row
+# per price break, the unit price when buying at least Quantity), or an
+# SQLite database with a price_breaks (part, quantity, price) table. Part
+# numbers are distributor specific, so one catalog can hold several
+# distributors. Catalogs are only read; big SQLite ones should have an index
+# on the part numbers:
+#
+#   CREATE INDEX price_breaks_part ON price_breaks (part);
+import argparse
+import csv
+import os
+import sqlite3
+import urllib.request
+
+import numpy as np
+
+import gen_bom
+import gen_orders
+
+# catalog CSV columns, in order of preference
+PART_COLUMNS = ["Part", "PN", "Part Number"]
+BREAK_COLUMNS = ["Quantity", "Break", "Qty"]
+PRICE_COLUMNS = ["Price", "Unit Price"]
+
+def find_column(header, names):
+  for name in names:
+    if name in header:
+      return header.index(name)
+  raise ValueError("catalog has none of the columns {}".format(", ".join(names)))
+
+class PriceCatalog(object):
+  """Price breaks per part number, from a CSV file or an SQLite database
+
+  SQLite catalogs are queried as parts are looked up, so huge catalogs
+  needn't be loaded; either way, each part's breaks are kept as arrays of
+  break quantities and unit prices, sorted by quantity.
+  """
+  def __init__(self, filename):
+    self.parts = dict()
+    self.db = None
+    with open(filename, 'rb') as f:
+      is_sqlite = f.read(16) == b"SQLite format 3\0"
+    if is_sqlite:
+      self.db = sqlite3.connect("file:{}?mode=ro".format(
+        urllib.request.pathname2url(os.path.abspath(filename))), uri=True)
+      if self.db.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') "
+          "AND name = 'price_breaks'").fetchone() is None:
+        self.db.close()
+        raise ValueError("{} has no price_breaks table".format(filename))
+    else:
+      rows = dict()
+      with open(filename, 'r') as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader)]
+        part_idx = find_column(header, PART_COLUMNS)
+        break_idx = find_column(header, BREAK_COLUMNS)
+        price_idx = find_column(header, PRICE_COLUMNS)
+        for row in reader:
+          if len(row) == 0:
+            continue
+          rows.setdefault(row[part_idx].strip(), []).append(
+              (int(row[break_idx]), float(row[price_idx])))
+      for part_num, breaks in rows.items():
+        self.parts[part_num] = self._arrays(breaks)
+
+  @staticmethod
+  def _arrays(breaks):
+    breaks = sorted(breaks)
+    return (np.array([q for (q, _) in breaks], dtype=np.int64),
+        np.array([p for (_, p) in breaks], dtype=np.float64))
+
+  def breaks(self, part_num):
+    """Returns (break quantities, unit prices) arrays for a part, or None if
+    it isn't in the catalog"""
+    if part_num not in self.parts and self.db is not None:
+      breaks = self.db.execute("SELECT quantity, price FROM price_breaks WHERE part = ?",
+          (part_num,)).fetchall()
+      self.parts[part_num] = self._arrays(breaks) if breaks else None
+    return self.parts.get(part_num)
+
+  def costs(self, part_num, needed):
+    """Returns (quantities to buy, total costs) arrays for buying at least
+    each of the needed quantities (an array) as cheaply as possible, or
+    None if the part isn't in the catalog
+
+    Buying more, up to one of the higher price breaks, is chosen when it
+    costs less than buying what's needed; quantities below the first break
+    are raised to it, as distributors won't sell fewer. Needing none costs
+    nothing.
+    """
+    breaks = self.breaks(part_num)
+    if breaks is None:
+      return None
+    (quantities, prices) = breaks
+    needed = np.asarray(needed, dtype=np.int64)
+    wanted = needed > 0
+    needed = np.where(wanted, np.maximum(needed, quantities[0]), 0)
+    tier = np.maximum(np.searchsorted(quantities, needed, side='right') - 1, 0)
+    buy = needed
+    cost = needed*prices[tier]
+    # each higher break is a candidate: (needed, breaks) matrices, where a
+    # break below what's needed isn't one
+    candidates = np.where((quantities[np.newaxis, :] >= needed[:, np.newaxis]) &
+        wanted[:, np.newaxis], quantities*prices, np.inf)
+    best = np.argmin(candidates, axis=1)
+    best_cost = candidates[np.arange(len(needed)), best]
+    cheaper = best_cost < cost
+    buy = np.where(cheaper, quantities[best], buy)
+    cost = np.where(cheaper, best_cost, cost)
+    return (buy, cost)
+
+  def best_quantity(self, part_num, needed):
+    """Returns (quantity to buy, total cost) for needing a quantity of a
+    part, or None if it isn't in the catalog"""
+    costs = self.costs(part_num, [needed])
+    if costs is None:
+      return None
+    return (int(costs[0][0]), float(costs[1][0]))
+
+  def close(self):
+    if self.db is not None:
+      self.db.close()
+
+def needed_quantities(lines, builds, minimum=0):
+  """Vectorized gen_orders.part_quantity: the parts needed of a part number
+  used on BOM lines of (count, overage), for each number of boards built"""
+  needed = np.zeros(len(builds), dtype=np.int64)
+  for (count, overage) in lines:
+    # same rounding as gen_orders.order_quantity
+    needed += np.ceil(np.round(builds*count*(100 + overage)/100.0, 6)).astype(np.int64)
+  return np.where(needed > 0, np.maximum(needed, minimum), needed)
+
+def sweep(parts, catalog, builds, minimum=0):
+  """Total cost of each number of boards built (an array), for one
+  distributor's parts from gen_orders.read_demand; returns (total costs,
+  part numbers missing from the catalog)"""
+  total = np.zeros(len(builds), dtype=np.float64)
+  missing = []
+  for part_num, lines in parts.items():
+    costs = catalog.costs(part_num, needed_quantities(lines, builds, minimum))
+    if costs is None:
+      missing.append(part_num)
+      continue
+    total += costs[1]
+  return (total, missing)
+
+def main():
+  parser = argparse.ArgumentParser(description="Writes the cost per board of building 1 to N boards, "
+      "from a grouped BOM and an offline price break catalog")
+  parser.add_argument("input", nargs="+", help="input BOM, or netlists with --netlist")
+  parser.add_argument("output", help="output CSV, with a row per number of boards built")
+  parser.add_argument("-c", "--catalog", required=True, help="price break catalog (CSV or SQLite)")
+  parser.add_argument("-d", "--distributor", default="mouser", choices=sorted(gen_orders.DISTRIBUTORS),
+      help="distributor whose part numbers are priced (default: mouser)")
+  parser.add_argument("--max", type=int, default=1000, help="largest number of boards built (default: 1000)")
+  parser.add_argument("--overage", type=float, default=0, metavar="PERCENT",
+      help="extra parts to buy per BOM line, unless the line has an Overage column (default: 0)")
+  parser.add_argument("--min-qty", type=int, default=0, metavar="N",
+      help="minimum quantity to order of each part (default: 0)")
+  parser.add_argument("-n", "--netlist", action="store_true",
+      help="read Eeschema XML netlists (as NETLIST or NETLIST=QUANTITY) instead of a BOM")
+
+  args = parser.parse_args()
+  if not args.netlist and len(args.input) > 1:
+    parser.error("only one BOM can be read; use --netlist to merge netlists")
+
+  if args.netlist:
+    try:
+      (comp, extra_fields, boards) = gen_bom.read_netlists(args.input)
+    except ValueError as e:
+      parser.error(str(e))
+    demand = gen_orders.read_demand(gen_bom.bom_rows(comp, extra_fields, boards),
+        [args.distributor], args.overage)
+  else:
+    with open(args.input[0], 'r') as f:
+      demand = gen_orders.read_demand(csv.reader(f), [args.distributor], args.overage)
+  if demand is None or args.distributor not in demand:
+    return
+
+  try:
+    catalog = PriceCatalog(args.catalog)
+  except ValueError as e:
+    parser.error(str(e))
+  builds = np.arange(1, args.max + 1)
+  (total, missing) = sweep(demand[args.distributor], catalog, builds, args.min_qty)
+  catalog.close()
+  for part_num in missing:
+    print("[WARN] {} isn't in the catalog".format(part_num))
+
+  with open(args.output, 'w') as f:
+    f.write("Boards,Total,Per Board\n")
+    for (n, cost) in zip(builds, total):
+      f.write("{},{:.2f},{:.4f}\n".format(n, cost, cost/n))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,122 @@
+# canonical component values, so "4k7", "4.7k", "4K7" and "4700" are all
+# the same value when grouping a BOM or matching components
+#
+# A value is split into whitespace (or comma or slash) separated tokens. A
+# comma between digits separates thousands when three digits follow it
+# (2,200u is 2200u), and is a decimal point otherwise (1,5k is 1.5k). The
+# first number, with an optional SI prefix and unit (4.7k, 100nF, 10 ohm)
+# or as an RKM code (4k7, 4R7, 2n2), becomes the main value, without its
+# unit, as the component's class says what it is;
+# tolerances (1%, ±5%), voltages (50V, 6V3), currents (500mA) and powers
+# (1/4W) are normalized too, and anything else (X7R, C0G, part names) is
+# kept as is. Values without a number are returned unchanged.
+import functools
+import re
+
+PREFIXES = {"p": -12, "n": -9, "u": -6, "µ": -6, "μ": -6, "m": -3, "": 0,
+    "k": 3, "K": 3, "M": 6, "G": 9}
+PREFIX_NAMES = {-12: "p", -9: "n", -6: "u", -3: "m", 0: "", 3: "k", 6: "M", 9: "G"}
+# units of the main value, which are dropped; the class says what it is
+VALUE_UNITS = ["F", "H", "\u03a9", "\u2126", "ohm", "ohms", "Ohm", "Ohms", ""]
+# units of secondary ratings, in the order they're written
+RATING_UNITS = ["V", "A", "W"]
+
+_PREFIX = "([pnuµμmkKMG]?)"
+_NUMBER_RE = re.compile(r"^(\d+(?:\.\d*)?|\.\d+)" + _PREFIX + "(.*)$")
+# RKM codes: the prefix (or R for none, or the unit) is the decimal point
+_RKM_RE = re.compile(r"^(\d+)([pnuµμmkKMGRrVAW])(\d+)(.*)$")
+_FRACTION_RE = re.compile(r"^(\d+)/(\d+)" + _PREFIX + "([VAW])$")
+_TOLERANCE_RE = re.compile(r"^(?:±|\+/?-)?(\d+(?:\.\d*)?|\.\d+)%$")
+_SPLIT_RE = re.compile(r"[\s,;]+")
+_THOUSANDS_COMMA_RE = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+
+def format_number(number, unit=""):
+  """Formats a number with an engineering prefix, e.g. 4700 as 4.7k"""
+  if number == 0:
+    return "0" + unit
+  exponent = 0
+  while abs(number) >= 1000 and exponent < 9:
+    number /= 1000.0
+    exponent += 3
+  while abs(number) < 1 and exponent > -12:
+    number *= 1000.0
+    exponent -= 3
+  # 6 significant digits hides float error, e.g. 4.7*1000
+  return "{:.6g}{}{}".format(number, PREFIX_NAMES[exponent], unit)
+
+def parse_number(token):
+  """Returns (number, unit) for a number with an optional prefix and unit,
+  or None"""
+  m = _RKM_RE.match(token)
+  if m is not None:
+    (whole, point, fraction, unit) = m.groups()
+    if point in RATING_UNITS:
+      # 6V3
+      if unit:
+        return None
+      (point, unit) = ("", point)
+    elif point in "Rr":
+      point = ""
+    return (float(whole + "." + fraction)*10**PREFIXES[point], unit)
+  m = _FRACTION_RE.match(token)
+  if m is not None:
+    (numerator, denominator, prefix, unit) = m.groups()
+    if int(denominator) == 0:
+      return None
+    return (float(numerator)/int(denominator)*10**PREFIXES[prefix], unit)
+  m = _NUMBER_RE.match(token)
+  if m is not None:
+    (number, prefix, unit) = m.groups()
+    if unit in "Rr" and unit:
+      # 0R, 10R
+      unit = ""
+    return (float(number)*10**PREFIXES[prefix], unit)
+  return None
+
+def tokenize(value):
+  # slashes separate tokens too (10u/25V), except in fractions (1/4W) and
+  # tolerances (+/-5%)
+  value = _DECIMAL_COMMA_RE.sub(".", _THOUSANDS_COMMA_RE.sub("", value.strip()))
+  for token in _SPLIT_RE.split(value):
+    if "/" in token and _FRACTION_RE.match(token) is None and \
+        _TOLERANCE_RE.match(token) is None:
+      for part in token.split("/"):
+        yield part
+    else:
+      yield token
+
+@functools.lru_cache(maxsize=1 << 16)
+def canonical_value(value):
+  """Returns the canonical form of a component value string"""
+  main = None
+  tolerance = None
+  ratings = dict()
+  rest = []
+  for token in tokenize(value):
+    if len(token) == 0:
+      continue
+    if main is not None and len(rest) == 0 and token in VALUE_UNITS:
+      # 4.7k ohm
+      continue
+    m = _TOLERANCE_RE.match(token)
+    if m is not None and tolerance is None:
+      tolerance = "{:g}%".format(float(m.group(1)))
+      continue
+    parsed = parse_number(token)
+    if parsed is not None:
+      (number, unit) = parsed
+      if unit in RATING_UNITS and unit not in ratings:
+        ratings[unit] = format_number(number, unit)
+        continue
+      if unit in VALUE_UNITS and main is None:
+        main = format_number(number)
+        continue
+    rest.append(token)
+  if main is None and tolerance is None and len(ratings) == 0:
+    return value
+  parts = [] if main is None else [main]
+  if tolerance is not None:
+    parts.append(tolerance)
+  parts.extend(ratings[unit] for unit in RATING_UNITS if unit in ratings)
+  return " ".join(parts + rest)